@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+"""
+Measure how long the PDDL successor generators take to generate a successor.
+By default, the script uses the airport task from the issue1134 use case.
+"""
+
+import argparse
+import itertools
+from pathlib import Path
+import time
+
+from machetli import pddl
+
+USE_CASE_DIR = (Path(__file__).resolve().parent.parent / "use-cases" /
+                "issue1134_pddl_sas")
+DEFAULT_DOMAIN = USE_CASE_DIR / "p11-domain.pddl"
+DEFAULT_PROBLEM = USE_CASE_DIR / "p11-airport3-p1.pddl"
+
+parser = argparse.ArgumentParser()
+parser.add_argument("domain", nargs="?", default=DEFAULT_DOMAIN)
+parser.add_argument("problem", nargs="?", default=DEFAULT_PROBLEM)
+parser.add_argument("--successors", type=int, default=20,
+                    help="number of successors generated per generator")
+args = parser.parse_args()
+
+state = pddl.generate_initial_state(args.domain, args.problem)
+print(f"Domain: {args.domain}")
+print(f"Problem: {args.problem}")
+
+for name, generator_class in sorted(pddl.GENERATORS.items()):
+    generator = generator_class()
+    start = time.perf_counter()
+    successors = list(itertools.islice(
+        generator.get_successors(state), args.successors))
+    duration = time.perf_counter() - start
+    if successors:
+        print(f"{name}: {len(successors)} successors, "
+              f"{duration / len(successors):.4f}s per successor")
+    else:
+        print(f"{name}: no successors")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+"""
+Measure how long it takes to read and write SAS^+ files. By default, the script uses the
+sokoban task from the segmentation fault use case.
+"""
+
+import argparse
+from pathlib import Path
+import tempfile
+import time
+
+from machetli import sas
+
+DEFAULT_PROBLEM = (Path(__file__).resolve().parent.parent / "use-cases" /
+                   "segmentation-fault_sas" / "output_petri_sokobanp01.sas")
+
+parser = argparse.ArgumentParser()
+parser.add_argument("problem", nargs="?", default=DEFAULT_PROBLEM)
+parser.add_argument("--repetitions", type=int, default=10)
+args = parser.parse_args()
+
+problem_size = Path(args.problem).stat().st_size / 1024**2
+
+
+def report(name, times):
+    best = min(times)
+    print(f"{name}: best {best:.4f}s, mean {sum(times) / len(times):.4f}s "
+          f"({problem_size / best:.1f} MiB/s)")
+
+
+read_times = []
+for _ in range(args.repetitions):
+    start = time.perf_counter()
+    state = sas.generate_initial_state(args.problem)
+    read_times.append(time.perf_counter() - start)
+
+write_times = []
+with tempfile.TemporaryDirectory() as tmp_dir:
+    output_path = Path(tmp_dir) / "task.sas"
+    for _ in range(args.repetitions):
+        start = time.perf_counter()
+        sas.write_file(state, output_path)
+        write_times.append(time.perf_counter() - start)
+
+print(f"Problem: {args.problem} ({problem_size:.2f} MiB)")
+report("read", read_times)
+report("write", write_times)
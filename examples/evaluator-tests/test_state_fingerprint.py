@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+"""
+Check that the fingerprint of a PDDL or SAS^+ state, which identifies the state
+in the evaluation cache, is the same in processes with different hash seeds.
+Pass a domain and problem file for PDDL or a single SAS^+ file.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+from machetli import pddl, sas
+from machetli.cache import get_state_fingerprint
+
+parser = argparse.ArgumentParser()
+parser.add_argument("files", nargs="+", help="domain and problem file or SAS^+ file")
+parser.add_argument("--print-fingerprint", action="store_true",
+                    help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+if args.print_fingerprint:
+    if len(args.files) == 1:
+        state = sas.generate_initial_state(args.files[0])
+    else:
+        state = pddl.generate_initial_state(*args.files)
+    print(get_state_fingerprint(state))
+    sys.exit()
+
+fingerprints = set()
+for seed in ["1", "2"]:
+    env = dict(os.environ, PYTHONHASHSEED=seed)
+    output = subprocess.check_output(
+        [sys.executable, __file__, "--print-fingerprint"] + args.files, env=env)
+    fingerprints.add(output.decode().strip())
+
+print("Testing state fingerprint...")
+if len(fingerprints) == 1:
+    print("Success: fingerprint does not depend on the hash seed.")
+else:
+    print(f"Fail: fingerprints differ between hash seeds: {sorted(fingerprints)}")
+    sys.exit(1)
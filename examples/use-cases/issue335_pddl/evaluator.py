@@ -14,9 +14,11 @@ TRANSLATOR = PLANNER_REPO / "src/translate/translate.py"
 # the behaviour we are searching for.
 def evaluate(domain_filename, problem_filename):
     command = [PYTHON37, str(TRANSLATOR), f"{domain_filename}", f"{problem_filename}"]
-    result = tools.run(command, cpu_time_limit=20, memory_limit=3338, text=True)
+    # The translator can be stopped as soon as the error shows up.
+    result = tools.run(command, cpu_time_limit=20, memory_limit=3338, text=True,
+                       stop_patterns=["AssertionError: Negated axiom impossible"])
 
-    return "AssertionError: Negated axiom impossible" in result.stderr
+    return result.stop_pattern is not None
 
 if __name__ == "__main__":
     pddl.run_evaluator(evaluate)
@@ -1,3 +1,5 @@
+__version__ = "0.12"
+
 from machetli.search import search
 
-__all__ = ["search"]
\ No newline at end of file
+__all__ = ["search"]
@@ -0,0 +1,160 @@
+"""
+Machetli can store the results of evaluations on disk, so states that were
+already evaluated earlier (in the same search or in an earlier run of the same
+script) do not have to be evaluated again. States are identified by a
+fingerprint, i.e., a hash of their content. For PDDL and SAS\\ :sup:`+` tasks,
+the fingerprint is based on the files that the evaluator sees, so the same task
+reached in two different ways gets the same fingerprint.
+
+In addition, parsed input files can be stored on disk, so scripts that are run
+repeatedly on the same input do not have to parse it every time.
+"""
+
+import gc
+import hashlib
+import io
+import logging
+import os
+from pathlib import Path
+import pickle
+from typing import Callable, Union
+
+import machetli
+
+
+def _write_task_text(key, value, stream):
+    # Import here to avoid loading the packages if they are not used.
+    from machetli.pddl import files as pddl_files
+    from machetli.pddl.constants import KEY_IN_STATE as PDDL_KEY_IN_STATE
+    from machetli.sas.constants import KEY_IN_STATE as SAS_KEY_IN_STATE
+    if key == SAS_KEY_IN_STATE:
+        value.output(stream)
+    elif key == PDDL_KEY_IN_STATE:
+        pddl_files._dump_domain(value, stream)
+        pddl_files._dump_problem(value, stream, sort_init=True)
+    else:
+        return False
+    return True
+
+
+def get_state_fingerprint(state: dict) -> str:
+    """
+    Return a hash of *state*. PDDL and SAS\\ :sup:`+` tasks contained in the
+    state are hashed based on the files written for them (with the initial
+    atoms of PDDL tasks in sorted order), all other entries of the state are
+    hashed based on their pickled representation. The hash of a task does not
+    depend on the hash seed of the process, so it stays the same across runs.
+    """
+    hasher = hashlib.sha256()
+    for key in sorted(state, key=str):
+        value = state[key]
+        hasher.update(f"{key!r}\n".encode())
+        stream = io.StringIO()
+        if _write_task_text(key, value, stream):
+            hasher.update(stream.getvalue().encode())
+        else:
+            hasher.update(pickle.dumps(value))
+    return hasher.hexdigest()
+
+
+def get_file_fingerprint(*paths: Union[Path, str]) -> str:
+    """
+    Return a hash of the content of the given files.
+    """
+    hasher = hashlib.sha256()
+    for path in paths:
+        hasher.update(Path(path).read_bytes())
+    return hasher.hexdigest()
+
+
+class EvaluationCache:
+    """
+    Persistent map from the fingerprint of a state and evaluator to the result
+    of evaluating the state. Each result is stored in a small file in
+    *cache_dir*, so results are available to later runs of the same script.
+    Changing the content of the evaluator script invalidates all stored results
+    for it.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self._evaluator_fingerprints = {}
+        self._results = {}
+
+    def get_key(self, evaluator_path: Path, state: dict) -> str:
+        """
+        Return the key under which the result of evaluating *state* with the
+        evaluator at *evaluator_path* is stored.
+        """
+        evaluator_path = Path(evaluator_path).absolute()
+        if evaluator_path not in self._evaluator_fingerprints:
+            self._evaluator_fingerprints[evaluator_path] = \
+                get_file_fingerprint(evaluator_path)
+        hasher = hashlib.sha256()
+        hasher.update(self._evaluator_fingerprints[evaluator_path].encode())
+        hasher.update(get_state_fingerprint(state).encode())
+        return hasher.hexdigest()
+
+    def _get_path(self, key):
+        return self.cache_dir / key[:2] / key
+
+    def lookup(self, key: str):
+        """
+        Return the stored result for *key* or ``None`` if there is none.
+        """
+        if key not in self._results:
+            path = self._get_path(key)
+            self._results[key] = path.read_text() if path.exists() else None
+        return self._results[key]
+
+    def store(self, key: str, result: str):
+        """
+        Store *result* under *key*.
+        """
+        path = self._get_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(result)
+        self._results[key] = result
+
+
+def _load_pickle(path):
+    # Tasks consist of many small objects without reference cycles. Running
+    # the garbage collector while creating them only costs time.
+    data = path.read_bytes()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.loads(data)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def load_parsed_task(cache_dir: Union[Path, str], kind: str,
+                     input_paths: list, parse: Callable):
+    """
+    Return the task parsed from the files in *input_paths*. If *cache_dir*
+    contains a task for the same *kind* of input, the same file contents and
+    the same Machetli version, it is loaded from there. Otherwise, the task
+    is computed with the function *parse* and stored in *cache_dir*.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(f"{machetli.__version__}\n{kind}\n".encode())
+    for input_path in input_paths:
+        hasher.update(get_file_fingerprint(input_path).encode())
+    cache_dir = Path(cache_dir)
+    path = cache_dir / f"{kind}-{hasher.hexdigest()}.pickle"
+    try:
+        return _load_pickle(path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logging.warning(f"Could not load parsed task from {path}: {e}")
+    task = parse()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first, so scripts running at the same time
+    # never see an incomplete file.
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(pickle.dumps(task, protocol=pickle.HIGHEST_PROTOCOL))
+    os.replace(tmp_path, path)
+    return task
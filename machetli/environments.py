@@ -1,7 +1,8 @@
 """
 Environments determine how Machetli executes its search. In a local environment,
-everything is executed sequentially on your local machine. However, the search
-can also be parallelized in a grid environment. In that case multiple successors
+everything is executed sequentially on your local machine. A local parallel
+environment runs several evaluations at the same time on your local machine.
+However, the search can also be parallelized in a grid environment. In that case multiple successors
 of a state will be evaluated in parallel on the compute nodes of the grid with
 the main search running on the login node, generating successors and dispatching
 and waiting for jobs.
@@ -9,13 +10,17 @@ and waiting for jobs.
 
 from importlib import resources
 import logging
+import os
 from pathlib import Path
 import pprint
 import re
+import shutil
+import signal
 import subprocess
 import time
 
 from machetli import tools, templates
+from machetli.cache import EvaluationCache
 from machetli.errors import SubmissionError, PollingError, \
     format_called_process_error
 from machetli.evaluator import EXIT_CODE_BEHAVIOR_PRESENT, \
@@ -63,9 +68,14 @@ class EvaluationTask():
     def __init__(self, successor, successor_id, run_dir):
         self.successor = successor
         self.successor_id = successor_id
+        # Tasks whose result was found in the evaluation cache are never
+        # written to disk and have no run directory.
         self.run_dir = run_dir
         self.status = self.PENDING
         self.error_msg = ""
+        self.cache_key = None
+        # Wall-clock time in seconds the evaluator ran, if known.
+        self.runtime = None
 
 
 class EvaluationJob():
@@ -83,6 +93,20 @@ class EvaluationJob():
         self.tasks = tasks
 
 
+RUNTIME_FILENAME = "runtime"
+"""
+Name of the file in a run directory where grid jobs and workers store the time
+in seconds the evaluator ran.
+"""
+
+
+def _read_runtime(task):
+    try:
+        task.runtime = float((task.run_dir/RUNTIME_FILENAME).read_text())
+    except (OSError, ValueError):
+        task.runtime = None
+
+
 def _update_completed_task_status(task, exit_code):
     if exit_code == EXIT_CODE_BEHAVIOR_PRESENT:
         task.status = EvaluationTask.DONE_AND_BEHAVIOR_PRESENT
@@ -127,6 +151,15 @@ class Environment:
           terminate
         * `CRITICAL`: silent unless the program crashes
 
+    :param use_cache:
+        If set to ``True``, successful evaluations are stored in an
+        :class:`EvaluationCache<machetli.cache.EvaluationCache>` in the
+        subdirectory ``cache`` of the experiment directory. Successors that were
+        already evaluated with the same evaluator script (in this search or in
+        an earlier run of the same script) are then not evaluated again. Only
+        use this if the outcome of an evaluation depends on nothing but the
+        state and the evaluator script.
+
     """
 
     STATE_FILENAME = "state.pickle"
@@ -136,7 +169,7 @@ class Environment:
     login and compute nodes.
     """
 
-    def __init__(self, batch_size=1, loglevel=logging.INFO):
+    def __init__(self, batch_size=1, loglevel=logging.INFO, use_cache=False):
         # TODO: this is accidentally doing what we want: in interactive python sessions
         # we don't have a script path and want to use the name of the current working directory
         # as the experiment name. This is what get_script_path returns, but this is coincidental.
@@ -152,6 +185,9 @@ class Environment:
         self.loglevel = loglevel
         self.initial_state = None
         self.initial_state_run_dir = None
+        self.cache = None
+        if use_cache:
+            self.cache = EvaluationCache(self.eval_dir / "cache")
 
     def start_new_iteration(self):
         """
@@ -161,6 +197,22 @@ class Environment:
         self.iteration_id += 1
         self.batch_id = 0
 
+    def resume(self):
+        """
+        Notifies the environment that an interrupted search is continued in
+        the existing experiment directory. New iterations are numbered after
+        the last iteration found on disk, so old run directories are kept and
+        not overwritten.
+        """
+        iteration_ids = [0]
+        if self.eval_dir.is_dir():
+            for path in self.eval_dir.glob("iteration_*"):
+                match = re.fullmatch(r"iteration_(\d+)", path.name)
+                if match:
+                    iteration_ids.append(int(match.group(1)))
+        self.iteration_id = max(iteration_ids)
+        self.batch_id = 0
+
     def _start_new_batch(self) -> tuple[Path, str]:
         self.batch_id += 1
         iteration_name = f"iteration_{self.iteration_id:05}"
@@ -185,15 +237,47 @@ class Environment:
         """
         Creates a run directory for each successor in *batch* and writes a
         pickled version of the state to disk. Returns an EvaluationJob that
-        represents the current status of this batch's evaluation.
+        represents the current status of this batch's evaluation. Successors
+        with a cached result get no run directory and their task is already
+        completed.
         """
         batch_dir, job_name = self._start_new_batch()
         tasks = []
         for task_id, successor in enumerate(batch):
+            cache_key = None
+            if self.cache:
+                cache_key = self.cache.get_key(evaluator_path, successor.state)
+                cached_status = self.cache.lookup(cache_key)
+                if cached_status is not None:
+                    task = EvaluationTask(successor, task_id, None)
+                    task.status = cached_status
+                    task.cache_key = cache_key
+                    tasks.append(task)
+                    continue
             run_dir = self._populate_run_dir(batch_dir, task_id, successor.state)
-            tasks.append(EvaluationTask(successor, task_id, run_dir))
+            task = EvaluationTask(successor, task_id, run_dir)
+            task.cache_key = cache_key
+            tasks.append(task)
         return EvaluationJob(job_name, evaluator_path, batch_dir, tasks)
 
+    def _complete_cached_tasks(self, job, on_task_completed):
+        for task in job.tasks:
+            if task.run_dir is not None or task.status == EvaluationTask.CANCELED:
+                continue
+            logging.debug(f"Using cached result '{task.status}' for task "
+                          f"{task.successor_id} of {job.name}.")
+            ids_to_cancel = on_task_completed(task) or []
+            for i in ids_to_cancel:
+                if job.tasks[i].status == EvaluationTask.PENDING:
+                    job.tasks[i].status = EvaluationTask.CANCELED
+
+    def _store_results_in_cache(self, job):
+        for task in job.tasks:
+            if (task.run_dir is not None and task.cache_key is not None and
+                    task.status in [EvaluationTask.DONE_AND_BEHAVIOR_PRESENT,
+                                    EvaluationTask.DONE_AND_BEHAVIOR_NOT_PRESENT]):
+                self.cache.store(task.cache_key, task.status)
+
     def _run_job(self, job, on_task_completed) -> list[EvaluationTask]:
         raise NotImplementedError
 
@@ -244,10 +328,95 @@ class Environment:
             indices into `successors` to indicate that those successors need not
             be evaluated any more.
         """
-        job = self._prepare_job(evaluator_path, batch)
-        self._run_job(job, on_task_completed)
+        return self.run_prepared(self.prepare(evaluator_path, batch),
+                                 on_task_completed)
+
+    def prepare(self, evaluator_path, batch) -> EvaluationJob:
+        """
+        Write the given successors to disk, so they can be evaluated with
+        :meth:`run_prepared` later. Together, both methods do the same as
+        :meth:`run`, but splitting them allows preparing the next batch while
+        the current one is evaluated. A prepared job that is not needed any
+        more should be removed with :meth:`discard`.
+        """
+        return self._prepare_job(evaluator_path, batch)
+
+    def run_prepared(self, job, on_task_completed) -> list[EvaluationTask]:
+        """
+        Evaluate a job created with :meth:`prepare`. See :meth:`run` for
+        details.
+        """
+        if self.cache:
+            self._complete_cached_tasks(job, on_task_completed)
+        if any(task.status == EvaluationTask.PENDING for task in job.tasks):
+            self._run_job(job, on_task_completed)
+        if self.cache:
+            self._store_results_in_cache(job)
         return job.tasks
 
+    def discard(self, job):
+        """
+        Delete the run directories of a job created with :meth:`prepare` that
+        will not be evaluated.
+        """
+        shutil.rmtree(job.batch_dir, ignore_errors=True)
+
+    def shutdown(self):
+        """
+        Release all resources held by the environment. The search calls this
+        once it is finished, even if it is aborted.
+        """
+        pass
+
+    def _open_queue(self):
+        """
+        Open the work queue of this environment for a new search. Tasks and
+        stop requests left over from an earlier search in the same
+        experiment directory are removed, so new workers do not exit
+        immediately.
+        """
+        queue = _get_worker_module().WorkQueue(self.eval_dir / "queue")
+        queue.reset()
+        return queue
+
+    def _run_job_on_workers(self, job, on_task_completed, queue,
+                            polling_interval, ensure_workers, preload=False):
+        """
+        Evaluate all pending tasks of *job* by passing them to the workers
+        listening on *queue*. The function *ensure_workers* is called
+        regularly to (re)start the workers if necessary. If *preload* is set,
+        the workers run the evaluator in forked processes (see
+        :mod:`machetli.worker`).
+        """
+        exit_code_filename = _get_worker_module().EXIT_CODE_FILENAME
+        queued_task_names = {}
+        for task in job.tasks:
+            if task.status == EvaluationTask.PENDING:
+                name = f"{job.name}-{task.successor_id:05}"
+                queue.put(name, task.run_dir, job.evaluator_path,
+                          self.STATE_FILENAME, preload=preload)
+                queued_task_names[task.successor_id] = name
+        while queued_task_names:
+            ensure_workers()
+            time.sleep(polling_interval)
+            for task_id in list(queued_task_names):
+                if task_id not in queued_task_names:
+                    continue
+                task = job.tasks[task_id]
+                result_file = task.run_dir/exit_code_filename
+                if not result_file.exists():
+                    continue
+                del queued_task_names[task_id]
+                _read_runtime(task)
+                _update_completed_task_status(task, _parse_exit_code(result_file))
+                ids_to_cancel = []
+                if on_task_completed:
+                    ids_to_cancel = on_task_completed(task) or []
+                for i in ids_to_cancel:
+                    if i in queued_task_names:
+                        queue.cancel(queued_task_names.pop(i))
+                        job.tasks[i].status = EvaluationTask.CANCELED
+
 
 class LocalEnvironment(Environment):
     """
@@ -257,7 +426,7 @@ class LocalEnvironment(Environment):
     """
     def _run_job(self, job, on_task_completed):
         for task in job.tasks:
-            if task.status == EvaluationTask.CANCELED:
+            if task.status != EvaluationTask.PENDING:
                 continue
             self._run_task(job.evaluator_path, task)
             ids_to_cancel = []
@@ -268,16 +437,185 @@ class LocalEnvironment(Environment):
                     job.tasks[i].status = EvaluationTask.CANCELED
 
     def _run_task(self, evaluator_path: Path, task):
+        start_time = time.monotonic()
+        process = self._start_task(evaluator_path, task)
+        process.wait()
+        task.runtime = time.monotonic() - start_time
+        _update_completed_task_status(task, process.returncode)
+
+    def _start_task(self, evaluator_path: Path, task, **kwargs):
         cmd = [str(evaluator_path.absolute()), self.STATE_FILENAME]
+        cwd = task.run_dir
+        with (cwd/"run.log").open("w") as run_log, (cwd/"run.err").open("w") as run_err:
+            # The child process keeps its own handles to the log files, so we
+            # can close ours as soon as it is started.
+            return subprocess.Popen(cmd, cwd=cwd, stdout=run_log, stderr=run_err,
+                                    **kwargs)
+
+
+class LocalParallelEnvironment(LocalEnvironment):
+    """
+    This environment evaluates multiple successors in parallel on the local
+    machine. Up to *num_processes* evaluators run at the same time. When the
+    search no longer needs the result of a running evaluation, the evaluator
+    and all processes it started are killed.
+
+    :param num_processes:
+        Maximal number of evaluators running in parallel. By default, this is
+        the number of CPUs of the machine.
+    :param batch_size: (default *num_processes*)
+        Number of successors evaluated in one batch.
+
+    See :class:`Environment` for inherited options.
+    """
+
+    POLLING_TIME_INTERVAL = 0.05
+    """
+    Time in seconds to wait between checks whether running evaluators have
+    terminated.
+    """
+    KILL_TIMEOUT = 5
+    """
+    Time in seconds that canceled evaluators get to terminate after receiving
+    SIGTERM before they are killed with SIGKILL.
+    """
+
+    def __init__(self, num_processes=None, batch_size=None, **kwargs):
+        self.num_processes = num_processes or os.cpu_count() or 1
+        Environment.__init__(self, batch_size=batch_size or self.num_processes,
+                             **kwargs)
+
+    def _run_job(self, job, on_task_completed):
+        queued_tasks = [task for task in job.tasks
+                        if task.status == EvaluationTask.PENDING]
+        queued_tasks.reverse()
+        processes = {}
+        start_times = {}
         try:
-            cwd = task.run_dir
-            with (cwd/"run.log").open("w") as run_log, (cwd/"run.err").open("w") as run_err:
-                process = subprocess.run(cmd, cwd=cwd, stdout=run_log, stderr=run_err)
-                exit_code = process.returncode
-        except subprocess.CalledProcessError as cpe:
-            logging.warning(f"Failed to run evaluator in {task.run_dir}: " + format_called_process_error(cpe))
+            while queued_tasks or processes:
+                while queued_tasks and len(processes) < self.num_processes:
+                    task = queued_tasks.pop()
+                    if task.status != EvaluationTask.PENDING:
+                        continue
+                    # Start a new session, so we can kill the evaluator
+                    # together with all processes it started.
+                    start_times[task.successor_id] = time.monotonic()
+                    processes[task.successor_id] = self._start_task(
+                        job.evaluator_path, task, start_new_session=True)
+                if not processes:
+                    break
+                time.sleep(self.POLLING_TIME_INTERVAL)
+                for task_id, process in list(processes.items()):
+                    if task_id not in processes or process.poll() is None:
+                        continue
+                    del processes[task_id]
+                    task = job.tasks[task_id]
+                    task.runtime = time.monotonic() - start_times[task_id]
+                    _update_completed_task_status(task, process.returncode)
+                    ids_to_cancel = []
+                    if on_task_completed:
+                        ids_to_cancel = on_task_completed(task) or []
+                    for i in ids_to_cancel:
+                        if job.tasks[i].status == EvaluationTask.PENDING:
+                            job.tasks[i].status = EvaluationTask.CANCELED
+                            if i in processes:
+                                self._kill(processes.pop(i))
+        finally:
+            # Only reached with running processes if the search is aborted.
+            for process in processes.values():
+                self._kill(process)
+
+    def _kill(self, process):
+        for sig in [signal.SIGTERM, signal.SIGKILL]:
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                pass
+            try:
+                process.wait(timeout=self.KILL_TIMEOUT)
+                return
+            except subprocess.TimeoutExpired:
+                pass
+        process.wait()
+
+
+class LocalWorkerEnvironment(Environment):
+    """
+    This environment starts *num_workers* worker processes on the local
+    machine that evaluate successors from a work queue on the file system (see
+    :mod:`machetli.worker`). It behaves like a
+    :class:`SlurmEnvironment<machetli.environments.SlurmEnvironment>` with
+    the option *num_workers* and is mainly useful to test worker setups
+    without a cluster.
+
+    :param num_workers:
+        Number of worker processes. By default, this is the number of CPUs of
+        the machine.
+    :param worker_idle_timeout: (default 600)
+        Workers terminate after this many seconds without work. Terminated
+        workers are restarted when new work arrives.
+    :param preload_evaluator:
+        If set to ``True``, each worker loads the evaluator script once and
+        forks a process for each evaluation instead of starting a new Python
+        interpreter. This saves the time for starting the interpreter and
+        importing modules, which matters for fast evaluators. The evaluator
+        script must not depend on running in a fresh interpreter.
+    :param batch_size: (default *num_workers*)
+        Number of successors evaluated in one batch.
+
+    See :class:`Environment` for inherited options.
+    """
+
+    POLLING_TIME_INTERVAL = 0.2
+    """
+    Time in seconds between checks whether queued tasks have terminated.
+    """
 
-        _update_completed_task_status(task, exit_code)
+    def __init__(self, num_workers=None, worker_idle_timeout=None,
+                 preload_evaluator=False, batch_size=None, **kwargs):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        Environment.__init__(self, batch_size=batch_size or self.num_workers,
+                             **kwargs)
+        self.worker_idle_timeout = (worker_idle_timeout or
+                                    _get_worker_module().DEFAULT_IDLE_TIMEOUT)
+        self.preload_evaluator = preload_evaluator
+        self.queue = None
+        self.worker_processes = []
+
+    def _run_job(self, job, on_task_completed):
+        if self.queue is None:
+            self.queue = self._open_queue()
+        self._run_job_on_workers(job, on_task_completed, self.queue,
+                                 self.POLLING_TIME_INTERVAL, self._ensure_workers,
+                                 preload=self.preload_evaluator)
+
+    def _ensure_workers(self):
+        if not self.worker_processes:
+            self.worker_processes = [None] * self.num_workers
+        for worker_id, process in enumerate(self.worker_processes):
+            if process is not None and process.poll() is None:
+                continue
+            # Tasks claimed by a worker that died are lost otherwise.
+            self.queue.requeue_tasks_of_worker(worker_id)
+            logging.debug(f"Starting worker {worker_id}.")
+            cmd = [tools.get_python_executable(), "-m", "machetli.worker",
+                   str(self.queue.queue_dir),
+                   "--idle-timeout", str(self.worker_idle_timeout),
+                   "--worker-id", str(worker_id)]
+            self.worker_processes[worker_id] = subprocess.Popen(cmd)
+
+    def shutdown(self):
+        if self.queue is not None:
+            self.queue.stop()
+            # The next search opens the queue again and removes the stop file.
+            self.queue = None
+        processes = [process for process in self.worker_processes
+                     if process is not None]
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        self.worker_processes = []
 
 
 class SlurmEnvironment(Environment):
@@ -305,6 +643,21 @@ class SlurmEnvironment(Environment):
         Additional bash script to set up the compute nodes (loading modules, etc.).
     :param batch_size: (default 200)
         Number of successors evaluated in parallel.
+    :param num_workers:
+        If set, the environment submits a single array job with this many
+        long-lived workers instead of one array job per batch. The workers
+        take successors from a work queue on the shared file system (see
+        :mod:`machetli.worker`), so later batches do not have to wait for the
+        Slurm scheduler. Workers terminate after *worker_idle_timeout* seconds
+        without work. Workers that terminated or were killed are resubmitted
+        individually when work arrives, and the successors they were
+        evaluating are put back into the queue.
+    :param worker_idle_timeout: (default 600)
+        Workers terminate after this many seconds without work.
+    :param preload_evaluator:
+        Only used together with *num_workers*. If set to ``True``, each worker
+        loads the evaluator script once and forks a process for each
+        evaluation instead of starting a new Python interpreter.
 
     See :class:`Environment` for inherited options.
     """
@@ -369,6 +722,12 @@ class SlurmEnvironment(Environment):
     pending tasks. This constant controls how many seconds to wait before
     polling again.
     """
+    WORKER_POLLING_TIME_INTERVAL = 1
+    """
+    When using workers, the login node checks the run directories of pending
+    tasks for results after this many seconds. The status of the worker job
+    itself is only queried every POLLING_TIME_INTERVAL seconds.
+    """
 
     # TODO: are differences to Lab reasonable? e.g., here we have no time limit.
     def __init__(
@@ -383,6 +742,9 @@ class SlurmEnvironment(Environment):
         export=None,
         setup=None,
         batch_size=200,
+        num_workers=None,
+        worker_idle_timeout=None,
+        preload_evaluator=False,
         **kwargs
     ):
         Environment.__init__(self, batch_size=batch_size, **kwargs)
@@ -399,23 +761,48 @@ class SlurmEnvironment(Environment):
 
         self.sbatch_template = resources.read_text(templates, "slurm-array-job.template")
 
+        self.num_workers = num_workers
+        self.worker_idle_timeout = (worker_idle_timeout or
+                                    _get_worker_module().DEFAULT_IDLE_TIMEOUT)
+        self.preload_evaluator = preload_evaluator
+        if preload_evaluator and not num_workers:
+            logging.critical("The option 'preload_evaluator' requires 'num_workers'.")
+        self.worker_sbatch_template = resources.read_text(
+            templates, "slurm-worker-job.template")
+        self.queue = None
+        # Maps worker IDs to the Slurm ID of the array job running the worker.
+        self.worker_slurm_ids = {}
+        self.last_worker_check = 0
+
     def _prepare_job(self, evaluator_path, batch):
         job = super()._prepare_job(evaluator_path, batch)
 
-        run_dirs = [task.run_dir for task in job.tasks]
+        run_dirs = [task.run_dir for task in job.tasks
+                    if task.run_dir is not None]
         # Give the NFS time to write the paths
         if not self._wait_for_filesystem(*run_dirs):
             logging.critical(
                 f"One of the following paths is missing:\n"
                 f"{pprint.pformat(run_dirs)}"
             )
-
-        self._write_sbatch_file(job)
         return job
 
     def _run_job(self, job, on_task_completed):
+        if self.num_workers:
+            if self.queue is None:
+                self.queue = self._open_queue()
+            self._run_job_on_workers(
+                job, on_task_completed, self.queue,
+                self.WORKER_POLLING_TIME_INTERVAL, self._ensure_workers,
+                preload=self.preload_evaluator)
+            return
+        # Only submit tasks that are not completed yet, e.g., because their
+        # result was cached.
+        job.slurm_task_ids = [task.successor_id for task in job.tasks
+                              if task.status == EvaluationTask.PENDING]
+        self._write_sbatch_file(job)
         self._submit(job)
-        pending_task_ids = set(range(len(job.tasks)))
+        pending_task_ids = set(job.slurm_task_ids)
         while pending_task_ids:
             time.sleep(self.POLLING_TIME_INTERVAL)
             self._update_status(job)
@@ -426,7 +813,9 @@ class SlurmEnvironment(Environment):
                     task = job.tasks[task_id]
                     if task.status != EvaluationTask.PENDING:
                         pending_task_ids.remove(task_id)
-                        ids_to_cancel = on_task_completed(task)
+                        ids_to_cancel = None
+                        if on_task_completed:
+                            ids_to_cancel = on_task_completed(task)
                         if ids_to_cancel:
                             self._cancel(job, ids_to_cancel)
                         pending_tasks_changed = True
@@ -451,11 +840,87 @@ class SlurmEnvironment(Environment):
                 # Not being able to cancel jobs is not critical, we can wait until the tasks exit normally.
                 logging.warning("Failed to cancel tasks: " + format_called_process_error(cpe))
 
-    def _get_job_params(self, job):
+    def _ensure_workers(self):
+        now = time.monotonic()
+        if now - self.last_worker_check < self.POLLING_TIME_INTERVAL:
+            return
+        self.last_worker_check = now
+        worker_ids = self._get_dead_workers()
+        if not worker_ids:
+            return
+        for worker_id in worker_ids:
+            # Tasks claimed by a worker that was killed (e.g., by a time
+            # limit) are lost otherwise.
+            self.queue.requeue_tasks_of_worker(worker_id)
+        self._submit_workers(worker_ids)
+
+    def _get_dead_workers(self):
+        """
+        Return the sorted IDs of all workers that were not submitted yet or
+        whose array task is no longer pending or running.
+        """
+        dead_workers = [worker_id for worker_id in range(self.num_workers)
+                        if worker_id not in self.worker_slurm_ids]
+        if not self.worker_slurm_ids:
+            return dead_workers
+        slurm_ids = sorted(set(self.worker_slurm_ids.values()))
+        try:
+            output = subprocess.check_output(
+                ["sacct", "-j", ",".join(slurm_ids), "--format=jobid,state",
+                 "--noheader", "--allocations"]).decode()
+        except subprocess.CalledProcessError as cpe:
+            raise PollingError(format_called_process_error(cpe))
+        # Pending array tasks can be listed as ranges, e.g., "123_[0-3]".
+        # Like jobs that were just submitted and do not show up yet, we treat
+        # them as alive by ignoring their lines.
+        pattern = re.compile(r"(?P<job_id>\d+)_(?P<task_id>\d+)\+?\s+(?P<status>\w+)\+?")
+        status = {}
+        for line in output.splitlines():
+            m = re.match(pattern, line.strip())
+            if m:
+                status[(m.group("job_id"), int(m.group("task_id")))] = m.group("status")
+        for worker_id, slurm_id in self.worker_slurm_ids.items():
+            slurm_status = status.get((slurm_id, worker_id))
+            if slurm_status is not None and slurm_status not in self.BUSY_STATES:
+                dead_workers.append(worker_id)
+        return sorted(dead_workers)
+
+    def _submit_workers(self, worker_ids):
+        workers_dir = self.eval_dir / "workers"
+        workers_dir.mkdir(parents=True, exist_ok=True)
+        job_params = self._get_common_job_params()
+        job_params["name"] = f"{self.exp_name}-workers"
+        job_params["logfile"] = str(workers_dir / "slurm.log")
+        job_params["errfile"] = str(workers_dir / "slurm.err")
+        job_params["worker_ids"] = _format_array_ids(worker_ids)
+        job_params["queue_dir"] = str(self.queue.queue_dir)
+        job_params["idle_timeout"] = self.worker_idle_timeout
+        logging.debug(
+            f"Parameters for worker template:\n{pprint.pformat(job_params)}")
+        sbatch_filename = workers_dir / f"{self.exp_name}-workers.sbatch"
+        sbatch_filename.write_text(self.worker_sbatch_template.format(**job_params))
+        slurm_id = self._submit_sbatch_file(sbatch_filename)
+        for worker_id in worker_ids:
+            self.worker_slurm_ids[worker_id] = slurm_id
+        logging.info(f"Submitted {len(worker_ids)} workers in batch job "
+                     f"{slurm_id}")
+
+    def shutdown(self):
+        if self.queue is not None:
+            self.queue.stop()
+            # The next search opens the queue again and removes the stop file.
+            self.queue = None
+        if self.worker_slurm_ids:
+            slurm_ids = sorted(set(self.worker_slurm_ids.values()))
+            try:
+                subprocess.check_call(["scancel"] + slurm_ids)
+            except subprocess.CalledProcessError as cpe:
+                # Workers also terminate on their own once the queue is stopped.
+                logging.warning("Failed to cancel workers: " + format_called_process_error(cpe))
+            self.worker_slurm_ids = {}
+
+    def _get_common_job_params(self):
         job_params = dict()
-        job_params["name"] = job.name
-        job_params["logfile"] = "slurm.log"
-        job_params["errfile"] = "slurm.err"
         job_params["partition"] = self.partition
         job_params["qos"] = self.qos
         job_params["memory_per_cpu"] = self.memory_per_cpu
@@ -468,10 +933,18 @@ class SlurmEnvironment(Environment):
             0.98 * self.cpus_per_task * self._get_memory_in_kb(
                 self.memory_per_cpu))
         job_params["python"] = tools.get_python_executable()
+        return job_params
+
+    def _get_job_params(self, job):
+        job_params = self._get_common_job_params()
+        job_params["name"] = job.name
+        job_params["logfile"] = "slurm.log"
+        job_params["errfile"] = "slurm.err"
         job_params["state_filename"] = self.STATE_FILENAME
-        run_dirs = [str(task.run_dir) for task in job.tasks]
+        run_dirs = [f"[{task_id}]={job.tasks[task_id].run_dir}"
+                    for task_id in job.slurm_task_ids]
         job_params["run_dirs"] = " ".join(run_dirs)
-        job_params["max_job_id"] = len(job.tasks) - 1
+        job_params["array_ids"] = _format_array_ids(job.slurm_task_ids)
         job_params["evaluator_path"] = str(job.evaluator_path.absolute())
         return job_params
 
@@ -480,8 +953,12 @@ class SlurmEnvironment(Environment):
         Submits the current slurm array job and stores its ID in job.slurm_id.
         If the submission fails, a SubmissionError is raised.
         """
+        job.slurm_id = self._submit_sbatch_file(job.sbatch_filename)
+        logging.info(f"Submitted batch job {job.slurm_id}")
+
+    def _submit_sbatch_file(self, sbatch_filename):
         submission_command = ["sbatch", "--export",
-                              ",".join(self.export), job.sbatch_filename]
+                              ",".join(self.export), sbatch_filename]
         try:
             output = subprocess.check_output(submission_command).decode()
         except subprocess.CalledProcessError as cpe:
@@ -491,9 +968,7 @@ class SlurmEnvironment(Environment):
         if not match:
             raise SubmissionError(
                 "Something went wrong, no job ID printed after job submission.")
-
-        job.slurm_id = match.group(1)
-        logging.info(f"Submitted batch job {job.slurm_id}")
+        return match.group(1)
 
     def _wait_for_filesystem(self, *paths: [Path]):
         attempts = int(self.FILESYSTEM_TIME_LIMIT / self.FILESYSTEM_TIME_INTERVAL)
@@ -543,7 +1018,8 @@ class SlurmEnvironment(Environment):
 
     def _update_status(self, job):
         status_by_task_id = self._get_slurm_status(job)
-        for task in job.tasks:
+        for task_id in job.slurm_task_ids:
+            task = job.tasks[task_id]
             try:
                 slurm_status = status_by_task_id[task.successor_id]
             except KeyError:
@@ -559,6 +1035,7 @@ class SlurmEnvironment(Environment):
                     task.status = EvaluationTask.CRITICAL
                     task.error_msg = f"Missing exit code file '{str(result_file)}'"
                     continue
+                _read_runtime(task)
                 _update_completed_task_status(task, exit_code)
             elif slurm_status in self.BUSY_STATES:
                 task.status = EvaluationTask.PENDING
@@ -590,6 +1067,25 @@ class SlurmEnvironment(Environment):
 
 
 
+def _get_worker_module():
+    # Import here, so running "python -m machetli.worker" does not find the
+    # module already imported through the package.
+    from machetli import worker
+    return worker
+
+
+def _format_array_ids(task_ids):
+    # Compress sorted task IDs into ranges, e.g., [0, 1, 2, 5] -> "0-2,5".
+    ranges = []
+    for task_id in task_ids:
+        if ranges and ranges[-1][1] == task_id - 1:
+            ranges[-1][1] = task_id
+        else:
+            ranges.append([task_id, task_id])
+    return ",".join(str(first) if first == last else f"{first}-{last}"
+                    for first, last in ranges)
+
+
 def _parse_exit_code(result_file):
     exitcode = int(Path(result_file).read_text())
     return exitcode
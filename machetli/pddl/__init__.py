@@ -35,9 +35,11 @@ def _get_successor_generators():
     all_generators = {}
 
     for key, value in generators.__dict__.items():
+        # Only consider generators defined in the module itself, not base
+        # classes imported from machetli.successors.
         if (isinstance(value, type)
             and issubclass(value, generators.SuccessorGenerator)
-                and value != generators.SuccessorGenerator):
+                and value.__module__ == generators.__name__):
             all_generators[key] = value
     return all_generators
 
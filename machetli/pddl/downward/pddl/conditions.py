@@ -3,10 +3,19 @@
 # based on a precomputed hash value.
 #
 # Careful: Most other classes (e.g. Effects, Axioms, Actions) are not!
+#
+# Since conditions are immutable, copies can share them with the original.
+# Literals are additionally interned, so there is only one object for each
+# literal and equal literals can be compared by identity.
+import threading
+import weakref
+
 from machetli.pddl.downward.pddl.task_element import TaskElement
 
 
 class Condition(TaskElement):
+    __slots__ = ["parts", "hash"]
+
     def accept(self, visitor):
         return visitor.visit_condition(self)
 
@@ -17,6 +26,12 @@ class Condition(TaskElement):
     def __hash__(self):
         return self.hash
 
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
     def __ne__(self, other):
         return not self == other
 
@@ -95,11 +110,15 @@ class Condition(TaskElement):
 class ConstantCondition(Condition):
     # Defining __eq__ blocks inheritance of __hash__, so must set it explicitly.
     __hash__ = Condition.__hash__
+    __slots__ = []
     parts = ()
 
     def __init__(self):
         self.hash = hash(self.__class__)
 
+    def __reduce__(self):
+        return self.__class__, ()
+
     def change_parts(self, parts):
         return self
 
@@ -112,6 +131,8 @@ class Impossible(Exception):
 
 
 class Falsity(ConstantCondition):
+    __slots__ = []
+
     def accept(self, visitor):
         return visitor.visit_condition_falsity(self)
 
@@ -123,6 +144,8 @@ class Falsity(ConstantCondition):
 
 
 class Truth(ConstantCondition):
+    __slots__ = []
+
     def accept(self, visitor):
         return visitor.visit_condition_truth(self)
 
@@ -139,6 +162,7 @@ class Truth(ConstantCondition):
 class JunctorCondition(Condition):
     # Defining __eq__ blocks inheritance of __hash__, so must set it explicitly.
     __hash__ = Condition.__hash__
+    __slots__ = []
 
     def __eq__(self, other):
         # Compare hash first for speed reasons.
@@ -157,6 +181,8 @@ class JunctorCondition(Condition):
 
 
 class Conjunction(JunctorCondition):
+    __slots__ = []
+
     def accept(self, visitor):
         return visitor.visit_condition_conjunction(self)
 
@@ -194,6 +220,8 @@ class Conjunction(JunctorCondition):
 
 
 class Disjunction(JunctorCondition):
+    __slots__ = []
+
     def accept(self, visitor):
         return visitor.visit_condition_disjunction(self)
 
@@ -225,6 +253,7 @@ class Disjunction(JunctorCondition):
 class QuantifiedCondition(Condition):
     # Defining __eq__ blocks inheritance of __hash__, so must set it explicitly.
     __hash__ = Condition.__hash__
+    __slots__ = ["parameters"]
 
     def __init__(self, parameters, parts):
         self.parameters = tuple(parameters)
@@ -275,6 +304,8 @@ class QuantifiedCondition(Condition):
 
 
 class UniversalCondition(QuantifiedCondition):
+    __slots__ = []
+
     def accept(self, visitor):
         return visitor.visit_condition_universal(self)
 
@@ -294,6 +325,8 @@ class UniversalCondition(QuantifiedCondition):
 
 
 class ExistentialCondition(QuantifiedCondition):
+    __slots__ = []
+
     def accept(self, visitor):
         return visitor.visit_condition_existential(self)
     def _untyped(self, parts):
@@ -319,22 +352,44 @@ class Literal(Condition):
     # Defining __eq__ blocks inheritance of __hash__, so must set it explicitly.
     __hash__ = Condition.__hash__
     parts = []
-    __slots__ = ["predicate", "args", "hash"]
+    __slots__ = ["predicate", "args", "__weakref__"]
+    # Maps (class, predicate, args) to the unique literal with these values.
+    # Literals that are no longer used anywhere are removed automatically, so
+    # long-running processes do not keep the literals of old tasks alive.
+    _interned = weakref.WeakValueDictionary()
+    # Successor generators can run in a background thread (see the option
+    # pipelined of search()), so two threads may create the same literal.
+    _intern_lock = threading.Lock()
+
+    def __new__(cls, predicate, args):
+        args = tuple(args)
+        key = (cls, predicate, args)
+        literal = Literal._interned.get(key)
+        if literal is None:
+            with Literal._intern_lock:
+                literal = Literal._interned.get(key)
+                if literal is None:
+                    literal = object.__new__(cls)
+                    literal.predicate = predicate
+                    literal.args = args
+                    literal.hash = hash(key)
+                    Literal._interned[key] = literal
+        return literal
 
     def __init__(self, predicate, args):
-        self.predicate = predicate
-        self.args = tuple(args)
-        self.hash = hash((self.__class__, self.predicate, self.args))
+        # All attributes are set when the literal is created in __new__.
+        pass
+
+    def __reduce__(self):
+        # Intern literals again when they are unpickled.
+        return self.__class__, (self.predicate, self.args)
 
+    # Literals are interned, so equal literals are identical.
     def __eq__(self, other):
-        # Compare hash first for speed reasons.
-        return (self.hash == other.hash and
-                self.__class__ is other.__class__ and
-                self.predicate == other.predicate and
-                self.args == other.args)
+        return self is other
 
     def __ne__(self, other):
-        return not self == other
+        return self is not other
 
     @property
     def key(self):
@@ -376,6 +431,8 @@ class Literal(Condition):
 
 
 class Atom(Literal):
+    __slots__ = []
+
     def accept(self, visitor):
         return visitor.visit_condition_atom(self)
 
@@ -404,6 +461,8 @@ class Atom(Literal):
 
 
 class NegatedAtom(Literal):
+    __slots__ = []
+
     def accept(self, visitor):
         return visitor.visit_condition_negated_atom(self)
     negated = True
@@ -1,4 +1,5 @@
 class TaskElement:
+    __slots__ = []
 
     def accept(self, visitor):
         pass
@@ -1,3 +1,5 @@
+import re
+
 __all__ = ["ParseError", "parse_nested_list"]
 
 class ParseError(Exception):
@@ -6,39 +8,78 @@ class ParseError(Exception):
     def __str__(self):
         return self.value
 
+COMMENT_REGEX = re.compile(r";[^\n]*")
+# Each match skips the whitespace before a token. Parentheses are tokens of
+# their own and "?" starts a new token, so "?x?y" consists of the tokens "?x"
+# and "?y".
+TOKEN_REGEX = re.compile(r"\s*([()]|\?[^\s()?]*|[^\s()?]+)")
+
 # Basic functions for parsing PDDL (Lisp) files.
 def parse_nested_list(input_file):
-    tokens = tokenize(input_file)
+    tokens, error = _scan(input_file)
+    if error and not tokens:
+        raise error
+    tokens = iter(tokens)
     next_token = next(tokens)
     if next_token != "(":
         raise ParseError("Expected '(', got %s." % next_token)
-    result = list(parse_list_aux(tokens))
-    for tok in tokens:  # Check that generator is exhausted.
+    result = []
+    # Lists enclosing the list that is currently being built.
+    stack = []
+    current = result
+    append = current.append
+    for token in tokens:
+        if token == "(":
+            nested = []
+            append(nested)
+            stack.append(current)
+            current = nested
+            append = current.append
+        elif token == ")":
+            if not stack:
+                break
+            current = stack.pop()
+            append = current.append
+        else:
+            append(token)
+    else:
+        # The tokens end early if the input contains a non-ASCII character.
+        raise error or ParseError("Missing ')'")
+    for tok in tokens:  # Check that all tokens are used.
         raise ParseError("Unexpected token: %s." % tok)
+    if error:
+        raise error
     return result
 
 def tokenize(input):
-    for line in input:
-        line = line.split(";", 1)[0]  # Strip comments.
-        try:
-            line.encode("ascii")
-        except UnicodeEncodeError:
-            raise ParseError("Non-ASCII character outside comment: %s" %
-                             line[0:-1])
-        line = line.replace("(", " ( ").replace(")", " ) ").replace("?", " ?")
-        for token in line.split():
-            yield token.lower()
+    """Yield the lowercase tokens in the given file or sequence of lines.
+    Raise a ParseError at the first line with a non-ASCII character outside
+    a comment after yielding the tokens before this line."""
+    tokens, error = _scan(input)
+    yield from tokens
+    if error:
+        raise error
 
-def parse_list_aux(tokenstream):
-    # Leading "(" has already been swallowed.
-    while True:
-        try:
-            token = next(tokenstream)
-        except StopIteration:
-            raise ParseError("Missing ')'")
-        if token == ")":
-            return
-        elif token == "(":
-            yield list(parse_list_aux(tokenstream))
-        else:
-            yield token
+def _scan(input):
+    # Return the list of tokens of the input before the first line with a
+    # non-ASCII character outside a comment and the ParseError for this line
+    # (or None). Scanning the whole text at once is much faster than
+    # processing it line by line.
+    if hasattr(input, "read"):
+        text = input.read()
+    else:
+        text = "".join(input)
+    error = None
+    if not text.isascii():
+        lines = text.split("\n")
+        for index, line in enumerate(lines):
+            if index < len(lines) - 1:
+                line += "\n"
+            line = line.split(";", 1)[0]  # Strip comments.
+            if not line.isascii():
+                error = ParseError("Non-ASCII character outside comment: %s" %
+                                   line[0:-1])
+                text = "\n".join(lines[:index])
+                break
+    text = COMMENT_REGEX.sub("", text).lower()
+    return TOKEN_REGEX.findall(text), error
@@ -1,21 +1,32 @@
+import io
 import logging
 from pathlib import Path
 from pickle import PickleError
 import sys
 from typing import Union
+import weakref
 
 from machetli.pddl.constants import KEY_IN_STATE
 from machetli.pddl.downward import pddl_parser
 from machetli.pddl.downward.pddl import Truth
 from machetli.pddl.downward.pddl.conditions import ConstantCondition, Atom
 
-from machetli import tools
+from machetli import cache, tools
 from machetli.evaluator import EXIT_CODE_CRITICAL, EXIT_CODE_BEHAVIOR_PRESENT, \
     EXIT_CODE_BEHAVIOR_NOT_PRESENT
 
 SIN = " "  # single indentation
 DIN = "  "  # double indentation
 
+# Maps actions and axioms to their PDDL text. Successors share all unchanged
+# actions and axioms with their parent, so they only have to be rendered once.
+# This relies on the generators never modifying actions and axioms in place.
+_rendered_elements = weakref.WeakKeyDictionary()
+# Maps initial atoms to their PDDL text. Atoms are interned and immutable, so
+# the text of an atom never changes. Like above, entries are dropped together
+# with the last task that uses an atom.
+_rendered_init_atoms = weakref.WeakKeyDictionary()
+
 
 def find_domain_path(task_path: Path):
     """
@@ -36,15 +47,28 @@ def find_domain_path(task_path: Path):
 
 
 def generate_initial_state(domain_path: Union[Path, str],
-                           task_path: Union[Path, str]) -> dict:
+                           task_path: Union[Path, str],
+                           cache_dir: Union[Path, str] = None) -> dict:
     """
     Parse the PDDL task defined in the given PDDL files. 
 
+    :param cache_dir: if given, the parsed task is stored in this directory
+        and loaded from there in later calls with files of the same
+        content. This is useful if a script is run repeatedly on large input
+        files.
     :return: a dictionary pointing to the task specified in the files.
     """
+    def parse():
+        return pddl_parser.open(domain_filename=domain_path,
+                                task_filename=task_path)
+
+    if cache_dir is None:
+        task = parse()
+    else:
+        task = cache.load_parsed_task(
+            cache_dir, "pddl", [domain_path, task_path], parse)
     return {
-        KEY_IN_STATE: pddl_parser.open(domain_filename=domain_path,
-                                       task_filename=task_path)
+        KEY_IN_STATE: task
     }
 
 
@@ -198,52 +222,76 @@ def _write_domain_functions(task, file):
         file.write(SIN + ")\n")
 
 
+def _write_rendered(element, write_element, file):
+    text = _rendered_elements.get(element)
+    if text is None:
+        buffer = io.StringIO()
+        write_element(element, buffer)
+        text = _rendered_elements[element] = buffer.getvalue()
+    file.write(text)
+
+
 def _write_domain_actions(task, file):
     for action in task.actions:
-        file.write(SIN + "(:action {}\n".format(action.name))
+        _write_rendered(action, _write_domain_action, file)
 
-        file.write(DIN + ":parameters (")
-        if action.parameters:
-            for par in action.parameters:
-                file.write("%s - %s " % (par.name, par.type_name))
-        file.write(")\n")
 
-        file.write(SIN + SIN + ":precondition\n")
-        if not isinstance(action.precondition, Truth):
-            action.precondition.dump_pddl(file, DIN)
-        file.write(DIN + ":effect\n")
-        file.write(DIN + "(and\n")
-        for eff in action.effects:
-            eff.dump_pddl(file, DIN)
-        if action.cost:
-            action.cost.dump_pddl(file, DIN + DIN)
-        file.write(DIN + ")\n")
+def _write_domain_action(action, file):
+    file.write(SIN + "(:action {}\n".format(action.name))
 
-        file.write(SIN + ")\n")
+    file.write(DIN + ":parameters (")
+    if action.parameters:
+        for par in action.parameters:
+            file.write("%s - %s " % (par.name, par.type_name))
+    file.write(")\n")
+
+    file.write(SIN + SIN + ":precondition\n")
+    if not isinstance(action.precondition, Truth):
+        action.precondition.dump_pddl(file, DIN)
+    file.write(DIN + ":effect\n")
+    file.write(DIN + "(and\n")
+    for eff in action.effects:
+        eff.dump_pddl(file, DIN)
+    if action.cost:
+        action.cost.dump_pddl(file, DIN + DIN)
+    file.write(DIN + ")\n")
+
+    file.write(SIN + ")\n")
 
 
 def _write_domain_axioms(task, file):
     for axiom in task.axioms:
-        file.write(SIN + "(:derived ({} ".format(axiom.name))
-        for par in axiom.parameters:
-            file.write("%s - %s " % (par.name, par.type_name))
-        file.write(")\n")
-        axiom.condition.dump_pddl(file, DIN)
-        file.write(SIN + ")\n")
+        _write_rendered(axiom, _write_domain_axiom, file)
+
+
+def _write_domain_axiom(axiom, file):
+    file.write(SIN + "(:derived ({} ".format(axiom.name))
+    for par in axiom.parameters:
+        file.write("%s - %s " % (par.name, par.type_name))
+    file.write(")\n")
+    axiom.condition.dump_pddl(file, DIN)
+    file.write(SIN + ")\n")
+
+
+def _dump_domain(task, file):
+    file.write("\n(")
+    _write_domain_header(task, file)
+    _write_domain_requirements(task, file)
+    _write_domain_types(task, file)
+    _write_domain_objects(task, file)
+    _write_domain_predicates(task, file)
+    _write_domain_functions(task, file)
+    _write_domain_axioms(task, file)
+    _write_domain_actions(task, file)
+    file.write(")\n")
 
 
 def _write_domain(task, path: Path):
-    with path.open("w") as file:
-        file.write("\n(")
-        _write_domain_header(task, file)
-        _write_domain_requirements(task, file)
-        _write_domain_types(task, file)
-        _write_domain_objects(task, file)
-        _write_domain_predicates(task, file)
-        _write_domain_functions(task, file)
-        _write_domain_axioms(task, file)
-        _write_domain_actions(task, file)
-        file.write(")\n")
+    # Writing the whole file at once is much faster than many small writes,
+    # especially on network file systems.
+    buffer = io.StringIO()
+    _dump_domain(task, buffer)
+    path.write_text(buffer.getvalue())
 
 
 def _write_problem_header(task, file):
@@ -254,13 +302,27 @@ def _write_problem_domain(task, file):
     file.write(SIN + "(:domain {})\n".format(task.domain_name))
 
 
-def _write_problem_init(task, file):
+def _write_problem_init(task, file, sort_init=False):
     file.write(SIN + "(:init\n")
 
+    lines = []
     for elem in task.init:
-        if isinstance(elem, Atom) and elem.predicate == "=":
-            continue
-        elem.dump_pddl(file, SIN + DIN)
+        if isinstance(elem, Atom):
+            if elem.predicate == "=":
+                continue
+            line = _rendered_init_atoms.get(elem)
+            if line is None:
+                buffer = io.StringIO()
+                elem.dump_pddl(buffer, SIN + DIN)
+                line = _rendered_init_atoms[elem] = buffer.getvalue()
+            lines.append(line)
+        else:
+            buffer = io.StringIO()
+            elem.dump_pddl(buffer, SIN + DIN)
+            lines.append(buffer.getvalue())
+    if sort_init:
+        lines.sort()
+    file.write("".join(lines))
     file.write(SIN + ")\n")
 
 
@@ -276,15 +338,23 @@ def _write_problem_metric(task, file):
         file.write("%s(:metric minimize (total-cost))\n" % SIN)
 
 
+def _dump_problem(task, file, sort_init=False):
+    # The parser stores the initial atoms in a set, so their order depends
+    # on the hash seed of the process. Sorting them gives the same output
+    # for the same task in every process.
+    file.write("\n(")
+    _write_problem_header(task, file)
+    _write_problem_domain(task, file)
+    _write_problem_init(task, file, sort_init)
+    _write_problem_goal(task, file)
+    _write_problem_metric(task, file)
+    file.write(")\n")
+
+
 def _write_problem(task, path: Path):
-    with path.open("w") as file:
-        file.write("\n(")
-        _write_problem_header(task, file)
-        _write_problem_domain(task, file)
-        _write_problem_init(task, file)
-        _write_problem_goal(task, file)
-        _write_problem_metric(task, file)
-        file.write(")\n")
+    buffer = io.StringIO()
+    _dump_problem(task, buffer)
+    path.write_text(buffer.getvalue())
 
 
 def write_files(state: dict, domain_path: Union[Path, str],
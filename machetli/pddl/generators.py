@@ -3,10 +3,21 @@ import logging
 
 from machetli.pddl import visitors
 from machetli.pddl.constants import KEY_IN_STATE
-from machetli.successors import Successor, SuccessorGenerator, RNG
+from machetli.pddl.downward.pddl import Atom, Conjunction, Disjunction, \
+    ExistentialCondition, Falsity, Literal, Task
+from machetli.successors import Successor, SuccessorGenerator, \
+    RemovalSuccessorGenerator
 
 
-class RemoveActions(SuccessorGenerator):
+def _with_task(state, task):
+    # Successors share everything but the task with their parent state. The
+    # visitors build the task so that it shares all unchanged elements.
+    child_state = copy.copy(state)
+    child_state[KEY_IN_STATE] = task
+    return child_state
+
+
+class RemoveActions(RemovalSuccessorGenerator):
     """
     For each action schema in the PDDL domain, generate a successor
     where this action schema is removed. The order of the successors is
@@ -15,20 +26,26 @@ class RemoveActions(SuccessorGenerator):
     def get_description(self):
         return "Tries to remove individual action schemas."
 
-    def get_successors(self, state):
-        task = state[KEY_IN_STATE]
-        action_names = [action.name for action in task.actions]
-        RNG.shuffle(action_names)
-        for name in action_names:
-            child_state = copy.deepcopy(state)
-            pre_child_task = child_state[KEY_IN_STATE]
-            child_state[KEY_IN_STATE] = pre_child_task.accept(
+    def get_elements(self, state):
+        return [action.name for action in state[KEY_IN_STATE].actions]
+
+    def remove_elements(self, state, elements):
+        child_task = state[KEY_IN_STATE]
+        for name in elements:
+            child_task = child_task.accept(
                 visitors.TaskElementEraseActionVisitor(name))
-            yield Successor(child_state,
-                            f"Removed action '{name}'. Remaining actions: {len(task.actions) - 1}")
+        return _with_task(state, child_task)
+
+    def get_change_message(self, state, elements):
+        num_remaining = len(state[KEY_IN_STATE].actions) - len(elements)
+        if len(elements) == 1:
+            return (f"Removed action '{elements[0]}'. "
+                    f"Remaining actions: {num_remaining}")
+        return (f"Removed {len(elements)} actions. "
+                f"Remaining actions: {num_remaining}")
 
 
-class RemovePredicates(SuccessorGenerator):
+class RemovePredicates(RemovalSuccessorGenerator):
     """
     For each predicate in the PDDL domain, generate a successor where
     this predicate is compiled away. This is accomplished by scanning
@@ -60,21 +77,26 @@ class RemovePredicates(SuccessorGenerator):
             logging.critical(f"Used unknown option '{replace_with}' for "
                              f"replacing predicates.")
 
-    def get_successors(self, state):
-        task = state[KEY_IN_STATE]
-        predicate_names = [predicate.name for predicate in task.predicates if
-                           not (predicate.name == "dummy_axiom_trigger" or predicate.name == "=")]
-        RNG.shuffle(predicate_names)
-        for name in predicate_names:
-            child_state = copy.deepcopy(state)
-            pre_child_task = child_state[KEY_IN_STATE]
-            child_state[KEY_IN_STATE] = pre_child_task.accept(self.visitor(name))
-            yield Successor(
-                child_state,
-                f"Removed predicate '{name}'. Remaining predicates: {len(task.predicates) - 1}")
-
-
-class RemoveObjects(SuccessorGenerator):
+    def get_elements(self, state):
+        return [predicate.name for predicate in state[KEY_IN_STATE].predicates
+                if not (predicate.name == "dummy_axiom_trigger" or predicate.name == "=")]
+
+    def remove_elements(self, state, elements):
+        child_task = state[KEY_IN_STATE]
+        for name in elements:
+            child_task = child_task.accept(self.visitor(name))
+        return _with_task(state, child_task)
+
+    def get_change_message(self, state, elements):
+        num_remaining = len(state[KEY_IN_STATE].predicates) - len(elements)
+        if len(elements) == 1:
+            return (f"Removed predicate '{elements[0]}'. "
+                    f"Remaining predicates: {num_remaining}")
+        return (f"Removed {len(elements)} predicates. "
+                f"Remaining predicates: {num_remaining}")
+
+
+class RemoveObjects(RemovalSuccessorGenerator):
     """
     For each object in the PDDL problem, generate a successor that
     removes this object from the PDDL task. The order of the successors
@@ -83,14 +105,169 @@ class RemoveObjects(SuccessorGenerator):
     def get_description(self):
         return "Tries to remove individual objects."
 
+    def get_elements(self, state):
+        return [obj.name for obj in state[KEY_IN_STATE].objects]
+
+    def remove_elements(self, state, elements):
+        child_task = state[KEY_IN_STATE]
+        for name in elements:
+            child_task = child_task.accept(
+                visitors.TaskElementEraseObjectVisitor(name))
+        return _with_task(state, child_task)
+
+    def get_change_message(self, state, elements):
+        num_remaining = len(state[KEY_IN_STATE].objects) - len(elements)
+        if len(elements) == 1:
+            return (f"Removed object '{elements[0]}'. "
+                    f"Remaining objects: {num_remaining}")
+        return (f"Removed {len(elements)} objects. "
+                f"Remaining objects: {num_remaining}")
+
+
+def _get_predicates(condition):
+    # Return the names of all predicates occurring in *condition*.
+    if isinstance(condition, Literal):
+        return {condition.predicate}
+    predicates = set()
+    for part in condition.parts:
+        predicates |= _get_predicates(part)
+    return predicates
+
+
+def _is_reachable(condition, reachable_predicates):
+    # Over-approximate whether *condition* can become true if all atoms of
+    # *reachable_predicates* can become true. Negative literals and universal
+    # conditions can always become true in this approximation.
+    if isinstance(condition, Atom):
+        return (condition.predicate == "=" or
+                condition.predicate in reachable_predicates)
+    if isinstance(condition, Falsity):
+        return False
+    if isinstance(condition, Conjunction):
+        return all(_is_reachable(part, reachable_predicates)
+                   for part in condition.parts)
+    if isinstance(condition, (Disjunction, ExistentialCondition)):
+        return any(_is_reachable(part, reachable_predicates)
+                   for part in condition.parts)
+    return True
+
+
+def _get_reachable_actions_and_axioms(task):
+    # Lifted relaxed reachability analysis: a predicate is reachable if it
+    # occurs in the initial state or is added by a reachable action or
+    # axiom, and an action or axiom is reachable if its condition only
+    # requires reachable predicates to be true.
+    reachable_predicates = {atom.predicate for atom in task.init
+                            if isinstance(atom, Atom)}
+    reachable_actions = set()
+    reachable_axioms = set()
+    changed = True
+    while changed:
+        changed = False
+        for index, action in enumerate(task.actions):
+            if index not in reachable_actions:
+                if not _is_reachable(action.precondition, reachable_predicates):
+                    continue
+                reachable_actions.add(index)
+            for effect in action.effects:
+                if (isinstance(effect.literal, Atom) and
+                        effect.literal.predicate not in reachable_predicates and
+                        _is_reachable(effect.condition, reachable_predicates)):
+                    reachable_predicates.add(effect.literal.predicate)
+                    changed = True
+        for index, axiom in enumerate(task.axioms):
+            if (index not in reachable_axioms and
+                    _is_reachable(axiom.condition, reachable_predicates)):
+                reachable_axioms.add(index)
+                reachable_predicates.add(axiom.name)
+                changed = True
+    return reachable_predicates, reachable_actions, reachable_axioms
+
+
+def _get_relevant_actions_and_axioms(task, action_indices, axiom_indices):
+    # Lifted backward relevance analysis: a predicate is relevant if it
+    # occurs in the goal, in the precondition of a relevant action, in the
+    # condition of an effect on a relevant predicate, or in the condition of
+    # a relevant axiom. Actions and axioms are relevant if they affect a
+    # relevant predicate.
+    relevant_predicates = _get_predicates(task.goal)
+    relevant_actions = set()
+    relevant_axioms = set()
+    changed = True
+    while changed:
+        num_relevant_predicates = len(relevant_predicates)
+        for index in action_indices:
+            action = task.actions[index]
+            for effect in action.effects:
+                if effect.literal.predicate in relevant_predicates:
+                    if index not in relevant_actions:
+                        relevant_actions.add(index)
+                        relevant_predicates |= _get_predicates(
+                            action.precondition)
+                    relevant_predicates |= _get_predicates(effect.condition)
+        for index in axiom_indices:
+            axiom = task.axioms[index]
+            if (index not in relevant_axioms and
+                    axiom.name in relevant_predicates):
+                relevant_axioms.add(index)
+                relevant_predicates |= _get_predicates(axiom.condition)
+        changed = len(relevant_predicates) > num_relevant_predicates
+    return relevant_predicates, relevant_actions, relevant_axioms
+
+
+class RemoveUnreachableAndIrrelevant(SuccessorGenerator):
+    """
+    Generate a single successor that removes all action schemas, axioms,
+    predicates and initial atoms that are unreachable from the initial state
+    or irrelevant for the goal. Reachability and relevance are
+    over-approximated on the level of predicates without grounding the
+    task. Atoms of unreachable predicates are replaced with false and
+    effects on irrelevant predicates are removed, so the transformation
+    keeps the set of plans intact. In contrast to removing the elements one
+    by one, a single evaluation can remove a large part of the task.
+    """
+    def get_description(self):
+        return ("Tries to remove all unreachable and irrelevant actions, "
+                "axioms and predicates at once.")
+
     def get_successors(self, state):
         task = state[KEY_IN_STATE]
-        object_names = [obj.name for obj in task.objects]
-        RNG.shuffle(object_names)
-        for name in object_names:
-            child_state = copy.deepcopy(state)
-            pre_child_task = child_state[KEY_IN_STATE]
-            child_state[KEY_IN_STATE] = pre_child_task.accept(
-                visitors.TaskElementEraseObjectVisitor(name))
-            yield Successor(child_state,
-                            f"Removed object '{name}'. Remaining objects: {len(task.objects) - 1}")
+        reachable_predicates, reachable_actions, reachable_axioms = \
+            _get_reachable_actions_and_axioms(task)
+        relevant_predicates, relevant_actions, relevant_axioms = \
+            _get_relevant_actions_and_axioms(
+                task, reachable_actions, reachable_axioms)
+        removed_predicates = [
+            predicate.name for predicate in task.predicates
+            if predicate.name != "=" and (
+                predicate.name not in reachable_predicates or
+                predicate.name not in relevant_predicates)]
+        num_removed_actions = len(task.actions) - len(relevant_actions)
+        num_removed_axioms = len(task.axioms) - len(relevant_axioms)
+        if not (removed_predicates or num_removed_actions or num_removed_axioms):
+            return
+
+        removed_predicate_set = set(removed_predicates)
+        child_task = Task(
+            task.domain_name, task.task_name, task.requirements, task.types,
+            task.objects, task.predicates, task.functions,
+            [atom for atom in task.init if not isinstance(atom, Atom)
+             or atom.predicate not in removed_predicate_set],
+            task.goal,
+            [action for index, action in enumerate(task.actions)
+             if index in relevant_actions],
+            [axiom for index, axiom in enumerate(task.axioms)
+             if index in relevant_axioms],
+            task.use_min_cost_metric)
+        # Remaining atoms of unreachable predicates are false in every
+        # reachable state. Irrelevant predicates only remain in effects,
+        # which are dropped when their literal becomes constant.
+        for name in removed_predicates:
+            child_task = child_task.accept(
+                visitors.TaskElementErasePredicateFalseAtomVisitor(name))
+        yield Successor(
+            _with_task(state, child_task),
+            f"Removed {num_removed_actions} actions, {num_removed_axioms} "
+            f"axioms and {len(removed_predicates)} predicates. Remaining "
+            f"actions: {len(child_task.actions)}, remaining predicates: "
+            f"{len(child_task.predicates)}")
@@ -1,10 +1,165 @@
+from collections import defaultdict
 import io
 from contextlib import redirect_stdout
+import weakref
 
 from machetli.pddl.downward.pddl import Task, TypedObject, Predicate, Action, \
     Axiom, Function, Truth, Conjunction, Disjunction, Falsity, \
     UniversalCondition, ExistentialCondition, Atom, NegatedAtom, Effect, Assign
-from machetli.pddl.downward.pddl.conditions import ConstantCondition
+from machetli.pddl.downward.pddl.conditions import ConstantCondition, Literal
+
+
+def _all_identical(elements, new_elements):
+    # Visitors return visited elements unchanged if the transformation does
+    # not affect them, so successors share these subtrees with their parent.
+    return all(new is old for old, new in zip(elements, new_elements))
+
+
+def _with_dummy_axiom_trigger(axiom):
+    return Axiom(axiom.name, axiom.parameters, axiom.num_external_parameters,
+                 Atom("dummy_axiom_trigger", []))
+
+
+class ElementOccurrences:
+    """Indices of the actions, axioms and initial atoms mentioning a
+    predicate or object, and whether the goal mentions it."""
+    __slots__ = ["actions", "axioms", "init", "goal"]
+
+    def __init__(self):
+        self.actions = set()
+        self.axioms = set()
+        self.init = set()
+        self.goal = False
+
+
+def _add_literals(condition, literals):
+    if isinstance(condition, Literal):
+        literals.add(condition)
+    else:
+        for part in condition.parts:
+            _add_literals(part, literals)
+
+
+def _get_literals(task):
+    # Yield (kind, index, literals) for all actions and axioms of the task.
+    for index, action in enumerate(task.actions):
+        literals = set()
+        _add_literals(action.precondition, literals)
+        for effect in action.effects:
+            _add_literals(effect.condition, literals)
+            literals.add(effect.literal)
+        yield "actions", index, literals
+    for index, axiom in enumerate(task.axioms):
+        literals = set()
+        _add_literals(axiom.condition, literals)
+        yield "axioms", index, literals
+
+
+class TaskOccurrences:
+    """Index from each predicate and object name of a task to the elements
+    mentioning it. For example, predicates[name].actions is the set of
+    indices of all actions with a precondition, effect condition or effect
+    on the predicate name. The axioms of a predicate include the axioms
+    deriving it."""
+
+    def __init__(self, task):
+        predicates = defaultdict(ElementOccurrences)
+        objects = defaultdict(ElementOccurrences)
+        for kind, index, literals in _get_literals(task):
+            for occurrences in self._get_occurrences(
+                    literals, predicates, objects):
+                getattr(occurrences, kind).add(index)
+        for index, axiom in enumerate(task.axioms):
+            predicates[axiom.name].axioms.add(index)
+        for index, atom in enumerate(task.init):
+            if not isinstance(atom, Assign):
+                predicates[atom.predicate].init.add(index)
+                for arg in atom.args:
+                    objects[arg].init.add(index)
+        goal_literals = set()
+        _add_literals(task.goal, goal_literals)
+        for occurrences in self._get_occurrences(
+                goal_literals, predicates, objects):
+            occurrences.goal = True
+        self.predicates = dict(predicates)
+        self.objects = dict(objects)
+
+    @staticmethod
+    def _get_occurrences(literals, predicates, objects):
+        predicate_names = {literal.predicate for literal in literals}
+        object_names = {arg for literal in literals for arg in literal.args
+                        if not arg.startswith("?")}
+        return ([predicates[name] for name in predicate_names] +
+                [objects[name] for name in object_names])
+
+
+_task_occurrences = weakref.WeakKeyDictionary()
+
+
+def _get_task_occurrences(task):
+    # Building the index takes longer than searching the task for a single
+    # name, so we only build it when a task is visited for the second time,
+    # e.g., to generate the second successor of the same parent.
+    if task not in _task_occurrences:
+        _task_occurrences[task] = None
+        return None
+    occurrences = _task_occurrences[task]
+    if occurrences is None:
+        occurrences = _task_occurrences[task] = TaskOccurrences(task)
+    return occurrences
+
+
+def _mentions(condition, is_match):
+    if isinstance(condition, Literal):
+        return is_match(condition)
+    for part in condition.parts:
+        if _mentions(part, is_match):
+            return True
+    return False
+
+
+def _find_occurrences(task, is_match):
+    occurrences = ElementOccurrences()
+    for index, action in enumerate(task.actions):
+        if _mentions(action.precondition, is_match) or any(
+                is_match(effect.literal) or _mentions(effect.condition, is_match)
+                for effect in action.effects):
+            occurrences.actions.add(index)
+    for index, axiom in enumerate(task.axioms):
+        if _mentions(axiom.condition, is_match):
+            occurrences.axioms.add(index)
+    occurrences.init = {
+        index for index, atom in enumerate(task.init)
+        if not isinstance(atom, Assign) and is_match(atom)}
+    occurrences.goal = _mentions(task.goal, is_match)
+    return occurrences
+
+
+def get_predicate_occurrences(task, name):
+    """
+    Return the :class:`ElementOccurrences` of the predicate *name* in
+    *task*. The occurrences of all names are indexed once a task is visited
+    repeatedly, so the task must not be modified afterwards.
+    """
+    task_occurrences = _get_task_occurrences(task)
+    if task_occurrences is not None:
+        return task_occurrences.predicates.get(name, ElementOccurrences())
+    occurrences = _find_occurrences(
+        task, lambda literal: literal.predicate == name)
+    occurrences.axioms.update(
+        index for index, axiom in enumerate(task.axioms) if axiom.name == name)
+    return occurrences
+
+
+def get_object_occurrences(task, name):
+    """
+    Return the :class:`ElementOccurrences` of the object *name* in *task*.
+    The same restrictions as for :func:`get_predicate_occurrences` apply.
+    """
+    task_occurrences = _get_task_occurrences(task)
+    if task_occurrences is not None:
+        return task_occurrences.objects.get(name, ElementOccurrences())
+    return _find_occurrences(task, lambda literal: name in literal.args)
 
 
 class TaskElementVisitor:
@@ -84,68 +239,80 @@ class TaskElementErasePredicateVisitor(TaskElementVisitor):
         self.predicate_name = predicate_name
 
     def visit_task(self, task):
+        # Only visit the elements mentioning the predicate, all other
+        # elements stay the same.
+        occurrences = get_predicate_occurrences(task, self.predicate_name)
         new_predicates = [
             predicate for predicate in task.predicates if predicate.name != self.predicate_name]
 
-        new_init = [atom for atom in task.init if isinstance(atom, Assign)
-                    or atom.predicate != self.predicate_name]
+        new_init = [atom for index, atom in enumerate(task.init)
+                    if index not in occurrences.init]
 
-        new_goal = task.goal.accept(self)
+        new_goal = task.goal.accept(self) if occurrences.goal else task.goal
 
-        new_actions = []
-        for action in task.actions:
-            new_actions.append(action.accept(self))
+        new_actions = [
+            action.accept(self) if index in occurrences.actions else action
+            for index, action in enumerate(task.actions)]
         new_actions = [action for action in new_actions if
                        action.effects and not isinstance(action.precondition, Falsity)]
 
-        new_axioms = []
-        for axiom in task.axioms:
-            new_axioms.append(axiom.accept(self))
+        new_axioms = [
+            axiom.accept(self) if index in occurrences.axioms else axiom
+            for index, axiom in enumerate(task.axioms)]
 
         # axioms whose (head became empty OR condition became falsity) were returned as None and must be filtered out
         new_axioms = [axiom for axiom in new_axioms if axiom is not None]
         is_dummy_trigger_added = False
         trigger_id = "dummy_axiom_trigger"
-        for ax in new_axioms:
+        for index, ax in enumerate(new_axioms):
             if isinstance(ax.condition, Truth):  # dummy axiom trigger needs to be created
                 if not is_dummy_trigger_added:
                     dummy_axiom_trigger = Predicate(trigger_id, [])
                     new_predicates.append(dummy_axiom_trigger)
                     new_init.append(Atom(trigger_id, []))
                     is_dummy_trigger_added = True
-                ax.condition = Atom(trigger_id, [])
+                # The axiom may be shared with the original task.
+                new_axioms[index] = _with_dummy_axiom_trigger(ax)
 
         return Task(task.domain_name, task.task_name, task.requirements, task.types, task.objects, new_predicates,
                     task.functions, new_init, new_goal, new_actions, new_axioms, task.use_min_cost_metric)
 
     def visit_condition_falsity(self, falsity):
-        return Falsity()
+        return falsity
 
     def visit_condition_truth(self, truth):
-        return Truth()
+        return truth
 
     def visit_condition_conjunction(self, conjunction):
         new_parts = []
         for part in conjunction.parts:
             new_parts.append(self.visit_condition(part))
+        if _all_identical(conjunction.parts, new_parts):
+            return conjunction
         return Conjunction(new_parts).simplified()
 
     def visit_condition_disjunction(self, disjunction):
         new_parts = []
         for part in disjunction.parts:
             new_parts.append(self.visit_condition(part))
+        if _all_identical(disjunction.parts, new_parts):
+            return disjunction
         return Disjunction(new_parts).simplified()
 
     def visit_condition_universal(self, universal_condition):
         new_parts = []
         for part in universal_condition.parts:
             new_parts.append(self.visit_condition(part))
+        if _all_identical(universal_condition.parts, new_parts):
+            return universal_condition
         return UniversalCondition(universal_condition.parameters, new_parts).simplified()
 
     def visit_condition_existential(self, existential_condition):
         new_parts = []
         for part in existential_condition.parts:
             new_parts.append(self.visit_condition(part))
+        if _all_identical(existential_condition.parts, new_parts):
+            return existential_condition
         return ExistentialCondition(existential_condition.parameters, new_parts).simplified()
 
     def visit_action(self, action):
@@ -157,6 +324,13 @@ class TaskElementErasePredicateVisitor(TaskElementVisitor):
         new_effects = []
         for effect in action.effects:
             new_effects.append(effect.accept(self))
+        if (new_precondition is action.precondition and
+                _all_identical(action.effects, new_effects)):
+            return action
+        # Action() uniquifies the variables of its effects in place, so it
+        # must not modify effects shared with the original action.
+        new_effects = [new_eff.copy() if new_eff is eff else new_eff
+                       for eff, new_eff in zip(action.effects, new_effects)]
         new_effects = [eff for eff in new_effects if
                        eff is not None and not isinstance(eff.literal, ConstantCondition) and not isinstance(
                            eff.condition, Falsity)]
@@ -170,6 +344,8 @@ class TaskElementErasePredicateVisitor(TaskElementVisitor):
         new_condition = effect.condition.accept(self)
         # parameters stay the same
         new_literal = effect.literal.accept(self)
+        if new_condition is effect.condition and new_literal is effect.literal:
+            return effect
         return Effect(effect.parameters, new_condition, new_literal)
 
     def visit_axiom(self, axiom):
@@ -178,6 +354,8 @@ class TaskElementErasePredicateVisitor(TaskElementVisitor):
         new_condition = axiom.condition.accept(self)
         if isinstance(new_condition, Falsity):  # axiom will never fire
             return None
+        if new_condition is axiom.condition:
+            return axiom
         #  truth conditions are handled in visit_task
         return Axiom(axiom.name, axiom.parameters, axiom.num_external_parameters, new_condition)
 
@@ -253,69 +431,81 @@ class TaskElementEraseObjectVisitor(TaskElementVisitor):
         self.object_name = object_name
 
     def visit_task(self, task):
+        # Only visit the elements mentioning the object, all other elements
+        # stay the same.
+        occurrences = get_object_occurrences(task, self.object_name)
         new_objects = [o for o in task.objects if o.name != self.object_name]
 
-        new_init = [atom for atom in task.init if isinstance(atom, Assign)
-                    or self.object_name not in atom.args]
+        new_init = [atom for index, atom in enumerate(task.init)
+                    if index not in occurrences.init]
 
-        new_goal = task.goal.accept(self)
+        new_goal = task.goal.accept(self) if occurrences.goal else task.goal
 
-        new_actions = []
-        for action in task.actions:
-            new_actions.append(action.accept(self))
+        new_actions = [
+            action.accept(self) if index in occurrences.actions else action
+            for index, action in enumerate(task.actions)]
         # Filter out actions that became trivial in teh transformation.
         new_actions = [action for action in new_actions if
                        action and action.effects and not isinstance(action.precondition, Falsity)]
 
-        new_axioms = []
-        for axiom in task.axioms:
-            new_axioms.append(axiom.accept(self))
+        new_axioms = [
+            axiom.accept(self) if index in occurrences.axioms else axiom
+            for index, axiom in enumerate(task.axioms)]
 
         # axioms whose (head became empty OR condition became falsity) were returned as None and must be filtered out
         new_axioms = [axiom for axiom in new_axioms if axiom is not None]
         is_dummy_trigger_added = False
         trigger_id = "dummy_axiom_trigger"
         new_predicates = list(task.predicates)
-        for ax in new_axioms:
+        for index, ax in enumerate(new_axioms):
             if isinstance(ax.condition, Truth):  # dummy axiom trigger needs to be created
                 if not is_dummy_trigger_added:
                     dummy_axiom_trigger = Predicate(trigger_id, [])
                     new_predicates.append(dummy_axiom_trigger)
                     new_init.append(Atom(trigger_id, []))
                     is_dummy_trigger_added = True
-                ax.condition = Atom(trigger_id, [])
+                # The axiom may be shared with the original task.
+                new_axioms[index] = _with_dummy_axiom_trigger(ax)
 
         return Task(task.domain_name, task.task_name, task.requirements, task.types, new_objects, new_predicates,
                     task.functions, new_init, new_goal, new_actions, new_axioms, task.use_min_cost_metric)
 
     def visit_condition_falsity(self, falsity):
-        return Falsity()
+        return falsity
 
     def visit_condition_truth(self, truth):
-        return Truth()
+        return truth
 
     def visit_condition_conjunction(self, conjunction):
         new_parts = []
         for part in conjunction.parts:
             new_parts.append(self.visit_condition(part))
+        if _all_identical(conjunction.parts, new_parts):
+            return conjunction
         return Conjunction(new_parts).simplified()
 
     def visit_condition_disjunction(self, disjunction):
         new_parts = []
         for part in disjunction.parts:
             new_parts.append(self.visit_condition(part))
+        if _all_identical(disjunction.parts, new_parts):
+            return disjunction
         return Disjunction(new_parts).simplified()
 
     def visit_condition_universal(self, universal_condition):
         new_parts = []
         for part in universal_condition.parts:
             new_parts.append(self.visit_condition(part))
+        if _all_identical(universal_condition.parts, new_parts):
+            return universal_condition
         return UniversalCondition(universal_condition.parameters, new_parts).simplified()
 
     def visit_condition_existential(self, existential_condition):
         new_parts = []
         for part in existential_condition.parts:
             new_parts.append(self.visit_condition(part))
+        if _all_identical(existential_condition.parts, new_parts):
+            return existential_condition
         return ExistentialCondition(existential_condition.parameters, new_parts).simplified()
 
     def visit_action(self, action):
@@ -327,6 +517,13 @@ class TaskElementEraseObjectVisitor(TaskElementVisitor):
         new_effects = []
         for effect in action.effects:
             new_effects.append(effect.accept(self))
+        if (new_precondition is action.precondition and
+                _all_identical(action.effects, new_effects)):
+            return action
+        # Action() uniquifies the variables of its effects in place, so it
+        # must not modify effects shared with the original action.
+        new_effects = [new_eff.copy() if new_eff is eff else new_eff
+                       for eff, new_eff in zip(action.effects, new_effects)]
         new_effects = [eff for eff in new_effects if
                        eff is not None and not isinstance(eff.literal, ConstantCondition) and not isinstance(
                            eff.condition, Falsity)]
@@ -340,6 +537,8 @@ class TaskElementEraseObjectVisitor(TaskElementVisitor):
         new_condition = effect.condition.accept(self)
         # parameters stay the same
         new_literal = effect.literal.accept(self)
+        if new_condition is effect.condition and new_literal is effect.literal:
+            return effect
         return Effect(effect.parameters, new_condition, new_literal)
 
     def visit_axiom(self, axiom):
@@ -348,6 +547,8 @@ class TaskElementEraseObjectVisitor(TaskElementVisitor):
         new_condition = axiom.condition.accept(self)
         if isinstance(new_condition, Falsity):  # axiom will never fire
             return None
+        if new_condition is axiom.condition:
+            return axiom
         #  truth conditions are handled in visit_task
         return Axiom(axiom.name, axiom.parameters, axiom.num_external_parameters, new_condition)
 
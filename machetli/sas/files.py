@@ -8,22 +8,32 @@ from machetli.sas.constants import KEY_IN_STATE
 from machetli.sas.sas_tasks import SASTask, SASVariables, SASMutexGroup, \
     SASInit, SASGoal, SASOperator, SASAxiom
 
-from machetli import tools
+from machetli import cache, tools
 from machetli.evaluator import EXIT_CODE_CRITICAL, EXIT_CODE_BEHAVIOR_PRESENT, \
     EXIT_CODE_BEHAVIOR_NOT_PRESENT
 
 
-def generate_initial_state(sas_file: Union[Path, str]) -> dict:
+def generate_initial_state(sas_file: Union[Path, str],
+                           cache_dir: Union[Path, str] = None) -> dict:
     r"""
     Parse the SAS\ :sup:`+` task defined in the SAS\ :sup:`+` file
     `sas_file` and return an initial state containing the parsed
     SAS\ :sup:`+` task.
 
+    :param cache_dir: if given, the parsed task is stored in this
+             directory and loaded from there in later calls with a file of
+             the same content. This is useful if a script is run
+             repeatedly on large input files.
     :return: a dictionary pointing to the SAS\ :sup:`+` task specified
              in the file `sas_file`.
     """
+    if cache_dir is None:
+        task = _read_task(Path(sas_file))
+    else:
+        task = cache.load_parsed_task(
+            cache_dir, "sas", [sas_file], lambda: _read_task(Path(sas_file)))
     return {
-        KEY_IN_STATE: _read_task(Path(sas_file))
+        KEY_IN_STATE: task
     }
 
 
@@ -75,133 +85,155 @@ def run_evaluator(evaluate):
 
 
 def _read_task(sas_file : Path) -> SASTask:
-    lines = (l for l in sas_file.read_text().splitlines())
-    while True:
-        line = next(lines)
-        if line == "begin_metric":
-            break
-    metric = bool(next(lines))
-    assert next(lines) == "end_metric"
+    # Reading the file with a single call and converting the integers of
+    # whole sections at once is much faster than processing the file line by
+    # line. Each _read_* function gets the index of the first line it should
+    # read and returns the index of the first line after its section.
+    lines = sas_file.read_text().splitlines()
+    pos = lines.index("begin_metric") + 1
+    metric = bool(lines[pos])
+    assert lines[pos + 1] == "end_metric"
+    pos += 2
     # read variables
-    num_vars = int(next(lines))
-    variables = _read_variables(lines, num_vars)
+    num_vars = int(lines[pos])
+    variables, pos = _read_variables(lines, pos + 1, num_vars)
     # read mutexes
-    num_mutexes = int(next(lines))
-    mutexes = _read_mutexes(lines, num_mutexes)
+    num_mutexes = int(lines[pos])
+    mutexes, pos = _read_mutexes(lines, pos + 1, num_mutexes)
     # read init state
-    init = _read_init_state(lines, num_vars)
+    init, pos = _read_init_state(lines, pos, num_vars)
     # read goal
-    goal = _read_goal(lines)
+    goal, pos = _read_goal(lines, pos)
     # read operators
-    num_operators = int(next(lines))
-    operators = _read_operators(lines, num_operators)
+    num_operators = int(lines[pos])
+    operators, pos = _read_operators(lines, pos + 1, num_operators)
     # read axioms
-    num_axioms = int(next(lines))
-    axioms = _read_axioms(lines, num_axioms)
+    num_axioms = int(lines[pos])
+    axioms, pos = _read_axioms(lines, pos + 1, num_axioms)
 
     sas_task = SASTask(variables, mutexes, init, goal, operators, axioms, metric)
     sas_task.validate()
     return sas_task
 
 
-def _read_variables(lines, num_vars):
+def _read_ints(lines, pos, num_lines):
+    # Convert all integers on the given lines with a single split.
+    return list(map(int, " ".join(lines[pos:pos + num_lines]).split()))
+
+
+def _read_facts(lines, pos, num_facts):
+    # Read num_facts lines of the form "var value".
+    values = _read_ints(lines, pos, num_facts)
+    assert len(values) == 2 * num_facts
+    return list(zip(values[0::2], values[1::2]))
+
+
+def _read_variables(lines, pos, num_vars):
     axiom_layers = []
     ranges = []
     value_name_lists = []
     for _ in range(num_vars):
-        assert next(lines) == "begin_variable"
-        next(lines)  # skip variable name
-        axiom_layers.append(int(next(lines)))
-        num_values = int(next(lines))
+        assert lines[pos] == "begin_variable"
+        # skip variable name
+        axiom_layers.append(int(lines[pos + 2]))
+        num_values = int(lines[pos + 3])
         ranges.append(num_values)
-        value_names = []
-        for _ in range(num_values):
-            value_names.append(next(lines))
-        value_name_lists.append(value_names)
-        assert next(lines) == "end_variable"
-    return SASVariables(ranges, axiom_layers, value_name_lists)
+        pos += 4
+        value_name_lists.append(lines[pos:pos + num_values])
+        pos += num_values
+        assert lines[pos] == "end_variable"
+        pos += 1
+    return SASVariables(ranges, axiom_layers, value_name_lists), pos
 
 
-def _read_mutexes(lines, num_mutexes):
+def _read_mutexes(lines, pos, num_mutexes):
     mutexes = []
     for _ in range(num_mutexes):
-        assert next(lines) == "begin_mutex_group"
-        num_facts = int(next(lines))
-        facts = []
-        for _ in range(num_facts):
-            var, val = map(int, next(lines).split(" "))
-            facts.append((var, val))
-        mutexes.append(SASMutexGroup(facts))
-        assert next(lines) == "end_mutex_group"
-    return mutexes
-
-
-def _read_init_state(lines, num_vars):
-    init = []
-    assert next(lines) == "begin_state"
-    for _ in range(num_vars):
-        val = int(next(lines))
-        init.append(val)
-    assert next(lines) == "end_state"
-    return SASInit(init)
-
-
-def _read_goal(lines):
-    assert next(lines) == "begin_goal"
-    num_pairs = int(next(lines))
-    pairs = []
-    for _ in range(num_pairs):
-        var, val = map(int, next(lines).split(" "))
-        pairs.append((var, val))
-    assert next(lines) == "end_goal"
-    return SASGoal(pairs)
-
-
-def _read_operators(lines, num_operators):
+        assert lines[pos] == "begin_mutex_group"
+        num_facts = int(lines[pos + 1])
+        pos += 2
+        facts = _read_ints(lines, pos, num_facts)
+        assert len(facts) == 2 * num_facts
+        mutexes.append(SASMutexGroup._from_array(facts))
+        pos += num_facts
+        assert lines[pos] == "end_mutex_group"
+        pos += 1
+    return mutexes, pos
+
+
+def _read_init_state(lines, pos, num_vars):
+    assert lines[pos] == "begin_state"
+    pos += 1
+    init = _read_ints(lines, pos, num_vars)
+    assert len(init) == num_vars
+    pos += num_vars
+    assert lines[pos] == "end_state"
+    return SASInit(init), pos + 1
+
+
+def _read_goal(lines, pos):
+    assert lines[pos] == "begin_goal"
+    num_pairs = int(lines[pos + 1])
+    pos += 2
+    pairs = _read_facts(lines, pos, num_pairs)
+    pos += num_pairs
+    assert lines[pos] == "end_goal"
+    return SASGoal(pairs), pos + 1
+
+
+def _read_operators(lines, pos, num_operators):
+    # Prevail conditions and effects are passed to the operators in the flat
+    # format of the file, so they do not have to be converted to facts and
+    # back.
     operators = []
     for _ in range(num_operators):
-        assert next(lines) == "begin_operator"
-        name = "(" + next(lines) + ")"
-        num_prevail_conditions = int(next(lines))
-        prevail_conditions = []
-        for _ in range(num_prevail_conditions):
-            var, val = map(int, next(lines).split(" "))
-            prevail_conditions.append((var, val))
-        num_effects = int(next(lines))
-        pre_post = []
-        for _ in range(num_effects):
-            effect_line = list(map(int, next(lines).split(" ")))
-            num_effect_conditions = effect_line[0]
-            cond = []
-            for cond_num in range(1, 2 * num_effect_conditions, 2):
-                var = effect_line[cond_num]
-                val = effect_line[cond_num + 1]
-                cond.append((var, val))
-            var, pre, post = effect_line[-3:]
-            pre_post.append((var, pre, post, cond))
-        cost = int(next(lines))
-        operators.append(SASOperator(name, prevail_conditions, pre_post, cost))
-        assert next(lines) == "end_operator"
-    return operators
-
-
-def _read_axioms(lines, num_axioms):
+        assert lines[pos] == "begin_operator"
+        name = "(" + lines[pos + 1] + ")"
+        num_prevail_conditions = int(lines[pos + 2])
+        pos += 3
+        prevail = _read_ints(lines, pos, num_prevail_conditions)
+        assert len(prevail) == 2 * num_prevail_conditions
+        pos += num_prevail_conditions
+        num_effects = int(lines[pos])
+        pos += 1
+        # Each effect line consists of the number of effect conditions, the
+        # conditions, and the variable with its pre- and post-value.
+        effects = _read_ints(lines, pos, num_effects)
+        pos += num_effects
+        if len(effects) == 4 * num_effects:
+            # Effects with conditions are longer, so there are none.
+            effect_offsets = range(0, len(effects) + 1, 4)
+        else:
+            effect_offsets = [0]
+            i = 0
+            for _ in range(num_effects):
+                i += 2 * effects[i] + 4
+                effect_offsets.append(i)
+            assert i == len(effects)
+        cost = int(lines[pos])
+        operators.append(SASOperator._from_arrays(
+            name, prevail, effects, effect_offsets, cost))
+        assert lines[pos + 1] == "end_operator"
+        pos += 2
+    return operators, pos
+
+
+def _read_axioms(lines, pos, num_axioms):
     axioms = []
     for _ in range(num_axioms):
-        assert next(lines) == "begin_rule"
-        length_body = int(next(lines))
-        condition = []
-        for _ in range(length_body):
-            var, val = map(int, next(lines).split(" "))
-            condition.append((var, val))
-        effect_line = list(map(int, next(lines).split(" ")))
-        var = effect_line[0]
-        val = effect_line[2]
-        assert 1 - val == effect_line[1]
+        assert lines[pos] == "begin_rule"
+        length_body = int(lines[pos + 1])
+        pos += 2
+        condition = _read_ints(lines, pos, length_body)
+        assert len(condition) == 2 * length_body
+        pos += length_body
+        var, old_val, val = map(int, lines[pos].split())
+        assert 1 - val == old_val
         effect = (var, val)
-        axioms.append(SASAxiom(condition, effect))
-        assert next(lines) == "end_rule"
-    return axioms
+        axioms.append(SASAxiom._from_array(condition, effect))
+        assert lines[pos + 1] == "end_rule"
+        pos += 2
+    return axioms, pos
 
 
 def write_file(state: dict, path: Union[Path, str]):
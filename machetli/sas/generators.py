@@ -1,14 +1,110 @@
+from array import array
+from collections import Counter, defaultdict
 import copy
-import itertools
+from itertools import compress
 import random
 
 from machetli.sas.constants import KEY_IN_STATE
-from machetli.sas.sas_tasks import SASTask, SASMutexGroup, SASInit, SASGoal, \
-    SASOperator, SASAxiom
-from machetli.successors import Successor, SuccessorGenerator, RNG
+from machetli.sas.sas_tasks import SASTask, SASVariables, SASMutexGroup, \
+    SASInit, SASGoal, SASOperator, SASAxiom
+from machetli.successors import Successor, SuccessorGenerator, \
+    RemovalSuccessorGenerator, RNG
 
 
-class RemoveOperators(SuccessorGenerator):
+def _with_task(state, task):
+    # Successors share everything but the task with their parent state. The
+    # task itself shares all components that did not change.
+    child_state = copy.copy(state)
+    child_state[KEY_IN_STATE] = task
+    return child_state
+
+
+def _replace_operator(task, index, operator):
+    new_operators = list(task.operators)
+    new_operators[index] = operator
+    return task.replace(operators=new_operators)
+
+
+def _remove_variables(task, removed_vars):
+    removed_vars = set(removed_vars)
+    variables = task.variables
+    occurrences = task.get_variable_occurrences()
+    # Map each variable to its index after the removal, or to None if it
+    # is removed.
+    new_index = []
+    num_kept = 0
+    for var in range(len(variables.ranges)):
+        if var in removed_vars:
+            new_index.append(None)
+        else:
+            new_index.append(num_kept)
+            num_kept += 1
+    kept_vars = [var for var in range(len(new_index))
+                 if new_index[var] is not None]
+    first_changed = min(removed_vars)
+
+    def project(facts):
+        return [(new_index[var], value) for var, value in facts
+                if new_index[var] is not None]
+
+    def update(components, component_occurrences, max_variables, rebuild):
+        # Only components mentioning a removed variable have to be
+        # rebuilt. Components mentioning only variables below
+        # first_changed are shared, all others just get new indices.
+        affected = set()
+        for var in removed_vars:
+            affected.update(component_occurrences[var])
+        new_components = []
+        for index, component in enumerate(components):
+            if index in affected:
+                component = rebuild(component)
+                if component is None:
+                    continue
+            elif max_variables[index] >= first_changed:
+                component = component._renumber_variables(new_index)
+            new_components.append(component)
+        return new_components
+
+    def rebuild_operator(op):
+        new_effects = [(new_index[var], pre, post, project(cond))
+                       for var, pre, post, cond in op.pre_post
+                       if new_index[var] is not None]
+        if not new_effects:
+            return None
+        return SASOperator(op.name, project(op.prevail), new_effects, op.cost)
+
+    def rebuild_axiom(ax):
+        var, value = ax.effect
+        if new_index[var] is None:
+            return None
+        # axiom condition may also be empty
+        return SASAxiom(project(ax.condition), (new_index[var], value))
+
+    new_variables = SASVariables(
+        [variables.ranges[var] for var in kept_vars],
+        [variables.axiom_layers[var] for var in kept_vars],
+        [variables.value_names[var] for var in kept_vars])
+    new_mutexes = update(
+        task.mutexes, occurrences.mutexes, occurrences.max_mutex_variables,
+        lambda group: SASMutexGroup(project(group.facts)))
+    new_init = SASInit([task.init.values[var] for var in kept_vars])
+    if all(var < first_changed for var, _ in task.goal.pairs):
+        new_goal = task.goal
+    else:
+        new_goal = SASGoal(project(task.goal.pairs))
+    new_operators = update(
+        task.operators, occurrences.operators,
+        occurrences.max_operator_variables, rebuild_operator)
+    new_axioms = update(
+        task.axioms, occurrences.axioms, occurrences.max_axiom_variables,
+        rebuild_axiom)
+
+    return task.replace(
+        variables=new_variables, mutexes=new_mutexes, init=new_init,
+        goal=new_goal, operators=new_operators, axioms=new_axioms)
+
+
+class RemoveOperators(RemovalSuccessorGenerator):
     """
     For each operator, generate a successor where this operator is
     removed. The order of the successors is randomized.
@@ -16,25 +112,30 @@ class RemoveOperators(SuccessorGenerator):
     def get_description(self):
         return "Tries to remove individual operators."
 
-    def get_successors(self, state):
+    def get_elements(self, state):
+        return [op.name for op in state[KEY_IN_STATE].operators]
+
+    def remove_elements(self, state, elements):
         task = state[KEY_IN_STATE]
-        operator_names = [op.name for op in task.operators]
-        RNG.shuffle(operator_names)
-        for name in operator_names:
-            child_state = copy.deepcopy(state)
-            pre_child_task = child_state[KEY_IN_STATE]
-            child_state[KEY_IN_STATE] = self.transform(pre_child_task, name)
-            yield Successor(child_state,
-                            f"Removed operator '{name}'. Remaining operators: {len(operator_names) - 1}")
+        removed_names = set(elements)
+        new_operators = [op for op in task.operators
+                         if op.name not in removed_names]
+        return _with_task(state, task.replace(operators=new_operators))
+
+    def get_change_message(self, state, elements):
+        num_remaining = len(state[KEY_IN_STATE].operators) - len(elements)
+        if len(elements) == 1:
+            return (f"Removed operator '{elements[0]}'. "
+                    f"Remaining operators: {num_remaining}")
+        return (f"Removed {len(elements)} operators. "
+                f"Remaining operators: {num_remaining}")
 
     def transform(self, task, op_name):
         new_operators = [op for op in task.operators if not op.name == op_name]
-
-        return SASTask(task.variables, task.mutexes, task.init, task.goal,
-                       new_operators, task.axioms, task.metric)
+        return task.replace(operators=new_operators)
 
 
-class RemoveVariables(SuccessorGenerator):
+class RemoveVariables(RemovalSuccessorGenerator):
     """
     For each variable, generate a successor where this variable is
     compiled away by removing it from the initial state as well as every
@@ -45,104 +146,28 @@ class RemoveVariables(SuccessorGenerator):
     def get_description(self):
         return "Tries to project away individual variables."
 
-    def get_successors(self, state):
-        task = state[KEY_IN_STATE]
-        variables = [var for var in range(len(task.variables.axiom_layers))]
-        RNG.shuffle(variables)
-        for var in variables:
-            child_state = copy.deepcopy(state)
-            pre_child_task = child_state[KEY_IN_STATE]
-            child_state[KEY_IN_STATE] = self.transform(pre_child_task, var)
-            yield Successor(child_state,
-                            f"Removed a variable. Remaining variables: {len(variables) - 1}")
+    def get_elements(self, state):
+        return list(range(len(state[KEY_IN_STATE].variables.axiom_layers)))
 
-    def transform(self, task, var):
-        # remove var attributes from variables object
-        new_variables = task.variables
-        del new_variables.axiom_layers[var]
-        del new_variables.ranges[var]
-        del new_variables.value_names[var]
-        # remove var from from mutex groups
-        new_mutexes = []
-        for group in task.mutexes:
-            new_facts = []
-            for fact in group.facts:
-                if fact[0] == var:
-                    continue
-                if fact[0] > var:
-                    variable_index, value = fact
-                    variable_index = variable_index - 1  # decrement variable indices above var
-                    fact = (variable_index, value)
-                new_facts.append(fact)
-            new_mutexes.append(SASMutexGroup(new_facts))
-        # remove var from init
-        new_init = SASInit(task.init.values)
-        del new_init.values[var]
-        # remove var from goal pairs and decrement higher indices than var
-        new_goal_pairs = []
-        for pair in task.goal.pairs:
-            if pair[0] == var:
-                continue
-            if pair[0] > var:
-                variable_index, value = pair
-                variable_index = variable_index - 1  # decrement variable indices above var
-                pair = (variable_index, value)
-            new_goal_pairs.append(pair)
-        new_goal = SASGoal(new_goal_pairs)
-        # remove var from operators
-        new_operators = []
-        for op in task.operators:
-            new_prevail = []
-            for pre in op.prevail:
-                if pre[0] == var:
-                    continue
-                if pre[0] > var:
-                    variable_index, value = pre
-                    variable_index = variable_index - 1  # decrement variable indices above var
-                    pre = (variable_index, value)
-                new_prevail.append(pre)
-            new_effects = []
-            for eff in op.pre_post:
-                v, pre, post, cond = eff
-                if v == var:
-                    continue
-                if v > var:
-                    v = v - 1  # decrement variable indices above var
-                new_cond = []
-                for precondition in cond:
-                    if precondition[0] == var:
-                        continue
-                    if precondition[0] > var:
-                        variable_index, value = precondition
-                        variable_index = variable_index - 1  # decrement variable indices above var
-                        precondition = (variable_index, value)
-                    new_cond.append(precondition)
-                new_effects.append((v, pre, post, new_cond))
-            if not new_effects:
-                continue
-            new_operators.append(SASOperator(op.name, new_prevail, new_effects, op.cost))
-        # remove var from condition and effect of axioms
-        new_axioms = []
-        for ax in task.axioms:
-            if ax.effect[0] == var:
-                continue
-            if ax.effect[0] > var:
-                variable_index, value = ax.effect
-                variable_index = variable_index - 1  # decrement variable indices above var
-                ax.effect = (variable_index, value)
-            new_condition = []
-            for cond in ax.condition:
-                if cond[0] == var:
-                    continue
-                if cond[0] > var:
-                    variable_index, value = cond
-                    variable_index = variable_index - 1  # decrement variable indices above var
-                    cond = (variable_index, value)
-                new_condition.append(cond)
-            # axiom condition may also be empty
-            new_axioms.append(SASAxiom(new_condition, ax.effect))
+    def get_element_key(self, state, element):
+        # Variable indices change when other variables are removed.
+        variables = state[KEY_IN_STATE].variables
+        return (variables.axiom_layers[element],
+                tuple(variables.value_names[element]))
+
+    def remove_elements(self, state, elements):
+        return _with_task(
+            state, _remove_variables(state[KEY_IN_STATE], elements))
+
+    def get_change_message(self, state, elements):
+        num_remaining = len(state[KEY_IN_STATE].variables.axiom_layers) - len(elements)
+        if len(elements) == 1:
+            return f"Removed a variable. Remaining variables: {num_remaining}"
+        return (f"Removed {len(elements)} variables. "
+                f"Remaining variables: {num_remaining}")
 
-        return SASTask(new_variables, new_mutexes, new_init, new_goal, new_operators, new_axioms, task.metric)
+    def transform(self, task, var):
+        return _remove_variables(task, [var])
 
 
 class RemovePrePosts(SuccessorGenerator):
@@ -161,11 +186,17 @@ class RemovePrePosts(SuccessorGenerator):
         task = state[KEY_IN_STATE]
         num_ops = len(task.operators)
         for op in RNG.sample(range(num_ops), num_ops):
-            num_eff = len(task.operators[op].pre_post)
+            operator = task.operators[op]
+            prevail = operator.prevail
+            pre_post = operator.pre_post
+            num_eff = len(pre_post)
             for effect in RNG.sample(range(num_eff), num_eff):
-                child_state = copy.deepcopy(state)
-                del child_state[KEY_IN_STATE].operators[op].pre_post[effect]
-                yield Successor(child_state, f"Removed an effect of operator '{task.operators[op].name}'.")
+                new_pre_post = pre_post[:effect] + pre_post[effect + 1:]
+                child_op = SASOperator(operator.name, prevail,
+                                       new_pre_post, operator.cost)
+                child_state = _with_task(
+                    state, _replace_operator(task, op, child_op))
+                yield Successor(child_state, f"Removed an effect of operator '{operator.name}'.")
 
 
 class SetUnspecifiedPreconditions(SuccessorGenerator):
@@ -187,18 +218,40 @@ class SetUnspecifiedPreconditions(SuccessorGenerator):
         task = state[KEY_IN_STATE]
         num_ops = len(task.operators)
         for op in RNG.sample(range(num_ops), num_ops):
-            num_eff = len(task.operators[op].pre_post)
+            operator = task.operators[op]
+            prevail = operator.prevail
+            pre_post = operator.pre_post
+            num_eff = len(pre_post)
             for effect in RNG.sample(range(num_eff), num_eff):
-                var, pre, post, cond = task.operators[op].pre_post[effect]
+                var, pre, post, cond = pre_post[effect]
                 if pre == -1:
                     num_val = task.variables.ranges[var]
                     for val in RNG.sample(range(num_val), num_val):
-                        child_state = copy.deepcopy(state)
-                        child_state[KEY_IN_STATE].operators[op].pre_post[
-                            effect] = (var, val, post, cond)
+                        new_pre_post = list(pre_post)
+                        new_pre_post[effect] = (var, val, post, cond)
+                        child_op = SASOperator(operator.name, prevail,
+                                               new_pre_post, operator.cost)
+                        child_state = _with_task(
+                            state, _replace_operator(task, op, child_op))
                         yield Successor(
                             child_state,
-                            f"Removed a prevail condition of operator '{task.operators[op].name}'.")
+                            f"Removed a prevail condition of operator '{operator.name}'.")
+
+
+def _get_combined_pre_post(op):
+    # Return dictionaries mapping variables to the values the operator
+    # requires before and guarantees after its application.
+    combined_pre, combined_post = {}, {}
+    for var, value in op.prevail:
+        combined_pre[var] = value
+        combined_post[var] = value
+    for var, pre, post, cond in op.pre_post:
+        if cond:
+            raise NotImplementedError("Conditional effects not yet supported.")
+        if pre != -1:
+            combined_pre[var] = pre
+        combined_post[var] = post
+    return combined_pre, combined_post
 
 
 class MergeOperators(SuccessorGenerator):
@@ -208,6 +261,8 @@ class MergeOperators(SuccessorGenerator):
     are removed and instead a new operator is added that is equivalent to
     executing the two operators in sequence. Cases where this is not
     possible (e.g., with conflicting prevail conditions) are skipped.
+    Pairs where the first operator achieves preconditions of the second
+    operator come first, ordered by the number of such preconditions.
     """
     def get_description(self):
         return ("Tries to replace a pair of operators with a single operator "
@@ -215,31 +270,73 @@ class MergeOperators(SuccessorGenerator):
 
     def get_successors(self, state):
         task = state[KEY_IN_STATE]
-        for op1, op2 in itertools.permutations(task.operators, 2):
-            child_state = copy.deepcopy(state)
-            child_task = self.transform(child_state[KEY_IN_STATE], op1, op2)
+        for index1, index2 in self._get_compatible_pairs(task.operators):
+            op1 = task.operators[index1]
+            op2 = task.operators[index2]
+            child_task = self.transform(task, op1, op2)
             if child_task:
-                child_state[KEY_IN_STATE] = child_task
-                yield Successor(child_state,
+                yield Successor(_with_task(state, child_task),
                                 f"Merged operators '{op1.name}' and '{op2.name}'. " +
                                 f"Remaining operators: {len(task.operators) - 1}")
 
-    def transform(self, task, op1, op2):
-        def combined_pre_post(op):
-            combined_pre, combined_post = {}, {}
-            for var, value in op.prevail:
-                combined_pre[var] = value
-                combined_post[var] = value
-            for var, pre, post, cond in op.pre_post:
-                if cond:
-                    raise NotImplementedError("Conditional effects not yet supported.")
-                if pre != -1:
-                    combined_pre[var] = pre
-                combined_post[var] = post
-            return combined_pre, combined_post
+    def _get_compatible_pairs(self, operators):
+        # Index the preconditions of all operators, so we can find the
+        # operators that can follow a given operator with set operations
+        # instead of looking at all pairs of operators.
+        pre_posts = [_get_combined_pre_post(op) for op in operators]
+        ops_with_pre_on_var = defaultdict(set)
+        ops_with_pre = defaultdict(set)
+        for index, (pre, _) in enumerate(pre_posts):
+            for var, value in pre.items():
+                ops_with_pre_on_var[var].add(index)
+                ops_with_pre[(var, value)].add(index)
+
+        def get_incompatible(index1):
+            # Operators with a precondition on a variable that op1 leaves
+            # with a different value cannot follow op1.
+            incompatible = {index1}
+            for var, value in pre_posts[index1][1].items():
+                incompatible |= ops_with_pre_on_var[var] - ops_with_pre[(var, value)]
+            return incompatible
+
+        # Ordering the pairs by the number of achieved preconditions needs
+        # these numbers for all pairs, so we compute them in a single pass
+        # over the operators. For each operator op1, we store the operators
+        # op2 that can follow op1 and where op1 achieves some preconditions
+        # of op2, together with the number of these preconditions.
+        linked_successors = []
+        linked_counts = []
+        max_count = 0
+        for index1, (pre1, post1) in enumerate(pre_posts):
+            num_achieved = Counter()
+            for var, value in post1.items():
+                if pre1.get(var) != value:
+                    num_achieved.update(ops_with_pre[(var, value)])
+            linked = sorted(num_achieved.keys() - get_incompatible(index1))
+            counts = array("i", map(num_achieved.__getitem__, linked))
+            max_count = max(max_count, max(counts, default=0))
+            linked_successors.append(array("i", linked))
+            linked_counts.append(counts)
+
+        for count in range(max_count, 0, -1):
+            for index1, successors in enumerate(linked_successors):
+                selected = map(count.__eq__, linked_counts[index1])
+                for index2 in compress(successors, selected):
+                    yield index1, index2
+        del linked_counts
 
-        pre1, post1 = combined_pre_post(op1)
-        pre2, post2 = combined_pre_post(op2)
+        # All other compatible pairs follow. They are only computed when the
+        # caller asks for them.
+        all_indices = set(range(len(operators)))
+        for index1 in range(len(operators)):
+            successors = all_indices.difference(
+                get_incompatible(index1), linked_successors[index1])
+            for index2 in sorted(successors):
+                yield index1, index2
+
+    def transform(self, task, op1, op2):
+        pre1, post1 = _get_combined_pre_post(op1)
+        pre2, post2 = _get_combined_pre_post(op2)
 
         # Check that op2 is applicable and update preconditions
         merged_pre = pre1
@@ -269,11 +366,13 @@ class MergeOperators(SuccessorGenerator):
 
         new_operators = [op for op in task.operators if op.name not in [op1.name, op2.name]] + [merged_op]
 
+        # Unlike task.replace, the constructor sorts the merged operator into
+        # its place.
         return SASTask(task.variables, task.mutexes, task.init, task.goal, new_operators,
                        task.axioms, task.metric)
 
 
-class RemoveGoals(SuccessorGenerator):
+class RemoveGoals(RemovalSuccessorGenerator):
     """
     For each goal condition, generate a successor where this goal condition
     is removed. The order of the successors is randomized
@@ -281,10 +380,152 @@ class RemoveGoals(SuccessorGenerator):
     def get_description(self):
         return "Tries to remove goal conditions."
 
+    def get_elements(self, state):
+        return list(state[KEY_IN_STATE].goal.pairs)
+
+    def get_element_key(self, state, element):
+        # Variable indices change when variables are removed.
+        var, value = element
+        return state[KEY_IN_STATE].variables.value_names[var][value]
+
+    def remove_elements(self, state, elements):
+        task = state[KEY_IN_STATE]
+        removed_pairs = set(elements)
+        new_goal = SASGoal([pair for pair in task.goal.pairs
+                            if pair not in removed_pairs])
+        return _with_task(state, task.replace(goal=new_goal))
+
+    def get_change_message(self, state, elements):
+        num_remaining = len(state[KEY_IN_STATE].goal.pairs) - len(elements)
+        if len(elements) == 1:
+            return f"Removed a goal. Remaining goals: {num_remaining}"
+        return (f"Removed {len(elements)} goals. "
+                f"Remaining goals: {num_remaining}")
+
+def _get_reachable_operators(task):
+    # Relaxed forward reachability analysis: collect all facts reachable
+    # from the initial state when ignoring delete effects, and return the
+    # indices of all operators whose conditions are reachable.
+    reached = set(enumerate(task.init.values))
+    conditions = [op.get_applicability_conditions() for op in task.operators]
+    pre_posts = [op.pre_post for op in task.operators]
+    axioms = [(ax.condition, ax.effect) for ax in task.axioms]
+    applicable = set()
+    changed = True
+    while changed:
+        changed = False
+        for index, condition in enumerate(conditions):
+            if index not in applicable:
+                if not all(fact in reached for fact in condition):
+                    continue
+                applicable.add(index)
+            for var, pre, post, cond in pre_posts[index]:
+                if ((var, post) not in reached and
+                        all(fact in reached for fact in cond)):
+                    reached.add((var, post))
+                    changed = True
+        for condition, effect in axioms:
+            if (effect not in reached and
+                    all(fact in reached for fact in condition)):
+                reached.add(effect)
+                changed = True
+    return applicable
+
+
+def _get_relevant_operators_and_variables(task, operator_indices):
+    # Backward relevance analysis: a variable is relevant if it occurs in
+    # the goal or in a condition of a relevant operator or axiom, and an
+    # operator or axiom is relevant if it affects a relevant variable.
+    relevant_vars = {var for var, _ in task.goal.pairs}
+    pre_posts = {index: task.operators[index].pre_post
+                 for index in operator_indices}
+    axioms = [(ax.condition, ax.effect[0]) for ax in task.axioms]
+    relevant_ops = set()
+    changed = True
+    while changed:
+        changed = False
+        for index, pre_post in pre_posts.items():
+            if index in relevant_ops or not any(
+                    var in relevant_vars for var, _, _, _ in pre_post):
+                continue
+            relevant_ops.add(index)
+            for var, _ in task.operators[index].prevail:
+                relevant_vars.add(var)
+            for var, pre, _, cond in pre_post:
+                if pre != -1:
+                    relevant_vars.add(var)
+                relevant_vars.update(cond_var for cond_var, _ in cond)
+            changed = True
+        for condition, var in axioms:
+            if var in relevant_vars:
+                new_vars = {cond_var for cond_var, _ in condition} - relevant_vars
+                if new_vars:
+                    relevant_vars |= new_vars
+                    changed = True
+    return relevant_ops, relevant_vars
+
+
+class RemoveUnreachableAndIrrelevant(SuccessorGenerator):
+    """
+    Generate a successor where all operators that are unreachable from the
+    initial state in a relaxed reachability analysis, all operators that
+    affect no variable relevant for the goal, and all irrelevant variables
+    are removed at once. As a fallback, generate one successor for each of
+    these three kinds of removals on its own. In contrast to removing the
+    elements one by one, a single evaluation can remove hundreds of them.
+    """
+    def get_description(self):
+        return ("Tries to remove all unreachable and irrelevant operators and "
+                "variables at once.")
+
     def get_successors(self, state):
         task = state[KEY_IN_STATE]
-        num_goals = len(task.goal.pairs)
-        for goal_id in RNG.sample(range(num_goals), num_goals):
-            child_state = copy.deepcopy(state)
-            del child_state[KEY_IN_STATE].goal.pairs[goal_id]
-            yield Successor(child_state, f"Removed a goal. Remaining goals: {num_goals - 1}")
\ No newline at end of file
+        num_ops = len(task.operators)
+        num_vars = len(task.variables.ranges)
+        reachable_ops = _get_reachable_operators(task)
+        relevant_ops, relevant_vars = _get_relevant_operators_and_variables(
+            task, reachable_ops)
+        unreachable_ops = set(range(num_ops)) - reachable_ops
+        irrelevant_ops = reachable_ops - relevant_ops
+        irrelevant_vars = set(range(num_vars)) - relevant_vars
+        # Without removing unreachable operators first, their conditions
+        # stay relevant.
+        _, relevant_vars_of_all_ops = _get_relevant_operators_and_variables(
+            task, set(range(num_ops)))
+        irrelevant_vars_of_all_ops = set(range(num_vars)) - relevant_vars_of_all_ops
+
+        def remove(removed_ops, removed_vars):
+            child_task = task.replace(operators=[
+                op for index, op in enumerate(task.operators)
+                if index not in removed_ops])
+            if removed_vars:
+                child_task = _remove_variables(child_task, removed_vars)
+            return _with_task(state, child_task)
+
+        removals = [
+            (unreachable_ops | irrelevant_ops, irrelevant_vars,
+             f"Removed {len(unreachable_ops)} unreachable operators, "
+             f"{len(irrelevant_ops)} irrelevant operators and "
+             f"{len(irrelevant_vars)} irrelevant variables."),
+            (unreachable_ops, set(),
+             f"Removed {len(unreachable_ops)} unreachable operators."),
+            (irrelevant_ops, set(),
+             f"Removed {len(irrelevant_ops)} irrelevant operators."),
+            (set(), irrelevant_vars_of_all_ops,
+             f"Removed {len(irrelevant_vars_of_all_ops)} irrelevant variables."),
+        ]
+        num_kinds = sum(1 for elements in [unreachable_ops, irrelevant_ops,
+                                           irrelevant_vars] if elements)
+        if num_kinds == 0:
+            return
+        if num_kinds == 1:
+            # The fallbacks would repeat the first successor.
+            removals = removals[:1]
+        for removed_ops, removed_vars, msg in removals:
+            if removed_ops or removed_vars:
+                child_state = remove(removed_ops, removed_vars)
+                child_task = child_state[KEY_IN_STATE]
+                yield Successor(
+                    child_state,
+                    f"{msg} Remaining operators: {len(child_task.operators)}, "
+                    f"remaining variables: {len(child_task.variables.ranges)}")
@@ -1,9 +1,121 @@
 # This File was taken from Fast Downward.
 
+from array import array
+import copy
+import sys
+
 SAS_FILE_VERSION = 3
 
 DEBUG = False
 
+# The components of a task use __slots__ and store facts in flat integer
+# arrays, so that large tasks need much less memory. The attributes of the
+# original Fast Downward classes are still available as properties, but the
+# lists they return are new objects: modifying them does not change the
+# component. Assign a new value to the attribute instead.
+
+
+def _flatten_facts(facts):
+    # Store the pairs [(var1, val1), (var2, val2), ...] as a flat array
+    # [var1, val1, var2, val2, ...].
+    return array("i", [value for fact in facts for value in fact])
+
+
+def _unflatten_facts(values):
+    return list(zip(values[0::2], values[1::2]))
+
+
+def _is_sorted_condition(values):
+    # Return whether the flat facts in values are sorted and mention each
+    # variable at most once, so sorting them would not change anything.
+    variables = values[0::2]
+    return all(var1 < var2 for var1, var2 in zip(variables, variables[1:]))
+
+
+def _format_facts(values):
+    # Formatting all facts with a single call is much faster than
+    # formatting them one by one. The result is a list with at most one
+    # element that contains all lines.
+    if not values:
+        return []
+    return ["\n".join(["%d %d"] * (len(values) // 2)) % tuple(values)]
+
+
+def _renumber_facts(values, new_index):
+    # Replace each variable var in the flat array values by new_index[var].
+    result = array("i", values)
+    result[0::2] = array("i", [new_index[var] for var in values[0::2]])
+    return result
+
+
+class _ArrayComponent:
+    # Pickle stores tuples of small integers much more compactly than
+    # arrays, so the slots listed in _array_slots are pickled as tuples.
+    __slots__ = []
+    _array_slots = ()
+
+    def __getstate__(self):
+        return [tuple(getattr(self, name)) if name in self._array_slots
+                else getattr(self, name) for name in self.__slots__]
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            if name in self._array_slots:
+                value = array("i", value)
+            setattr(self, name, value)
+
+
+def _sort_operators(operators):
+    # Sorting by name alone gives the same order if the names are unique,
+    # which they usually are, and avoids unpacking the arrays of all
+    # operators.
+    names = {op.name for op in operators}
+    if len(names) == len(operators):
+        return sorted(operators, key=lambda op: op.name)
+    return sorted(operators, key=lambda op: (
+        op.name, op.prevail, op.pre_post))
+
+
+class SASVariableOccurrences:
+    """Index from each variable of a task to the mutex groups, operators
+    and axioms mentioning it.
+
+    For example, operators[var] is the sorted list of indices of all
+    operators with a prevail condition, effect or effect condition on
+    var. In addition, max_operator_variables[i] is the highest variable
+    mentioned by operator i (-1 if there is none), and likewise for
+    mutex groups and axioms."""
+
+    def __init__(self, task):
+        num_vars = len(task.variables.ranges)
+        self.mutexes, self.max_mutex_variables = self._build_index(
+            task.mutexes, num_vars)
+        self.operators, self.max_operator_variables = self._build_index(
+            task.operators, num_vars)
+        self.axioms, self.max_axiom_variables = self._build_index(
+            task.axioms, num_vars)
+
+    @staticmethod
+    def _build_index(components, num_vars):
+        occurrences = [[] for _ in range(num_vars)]
+        max_variables = []
+        for index, component in enumerate(components):
+            variables = set(component._get_variables())
+            for var in variables:
+                occurrences[var].append(index)
+            max_variables.append(max(variables, default=-1))
+        return occurrences, max_variables
+
+
+def _write_lines(stream, component):
+    # Collect all lines of a component and write them with a single call.
+    # This is much faster than printing each line separately, especially
+    # when writing to a network file system.
+    lines = []
+    component._append_lines(lines)
+    lines.append("")
+    stream.write("\n".join(lines))
+
 
 class SASTask:
     """Planning task in finite-domain representation.
@@ -19,14 +131,48 @@ class SASTask:
         self.mutexes = mutexes
         self.init = init
         self.goal = goal
-        self.operators = sorted(operators, key=lambda op: (
-            op.name, op.prevail, op.pre_post))
+        self.operators = _sort_operators(operators)
+        # Comparing the flat condition arrays is equivalent to comparing
+        # the lists of facts.
         self.axioms = sorted(axioms, key=lambda axiom: (
-            axiom.condition, axiom.effect))
+            axiom._condition, axiom.effect))
         self.metric = metric
         if DEBUG:
             self.validate()
 
+    def __getstate__(self):
+        # The index is cheap to recompute compared to pickling it, and it
+        # must not be shared with tasks created by replace().
+        state = self.__dict__.copy()
+        state.pop("_variable_occurrences", None)
+        return state
+
+    def get_variable_occurrences(self):
+        """Return a :class:`SASVariableOccurrences` index of this task.
+
+        The index is computed on first use and cached, so the task must
+        not be modified afterwards."""
+        if not hasattr(self, "_variable_occurrences"):
+            self._variable_occurrences = SASVariableOccurrences(self)
+        return self._variable_occurrences
+
+    def replace(self, **components):
+        """Return a copy of the task in which the components given as keyword
+        arguments (e.g., ``operators=...``) are replaced.
+
+        All other components are shared with this task rather than copied,
+        so successors of a task only allocate the parts they change. For
+        this to work, tasks and their components must never be modified in
+        place. Operators and axioms given here are not sorted again."""
+        task = copy.copy(self)
+        for name, value in components.items():
+            if not hasattr(task, name):
+                raise AttributeError(f"SASTask has no component '{name}'")
+            setattr(task, name, value)
+        if DEBUG:
+            task.validate()
+        return task
+
     def validate(self):
         """Fail an assertion if the task is invalid.
 
@@ -78,24 +224,23 @@ class SASTask:
         print("metric: %s" % self.metric)
 
     def output(self, stream):
-        print("begin_version", file=stream)
-        print(SAS_FILE_VERSION, file=stream)
-        print("end_version", file=stream)
-        print("begin_metric", file=stream)
-        print(int(self.metric), file=stream)
-        print("end_metric", file=stream)
-        self.variables.output(stream)
-        print(len(self.mutexes), file=stream)
+        _write_lines(stream, self)
+
+    def _append_lines(self, lines):
+        lines += ["begin_version", str(SAS_FILE_VERSION), "end_version",
+                  "begin_metric", str(int(self.metric)), "end_metric"]
+        self.variables._append_lines(lines)
+        lines.append(str(len(self.mutexes)))
         for mutex in self.mutexes:
-            mutex.output(stream)
-        self.init.output(stream)
-        self.goal.output(stream)
-        print(len(self.operators), file=stream)
+            mutex._append_lines(lines)
+        self.init._append_lines(lines)
+        self.goal._append_lines(lines)
+        lines.append(str(len(self.operators)))
         for op in self.operators:
-            op.output(stream)
-        print(len(self.axioms), file=stream)
+            op._append_lines(lines)
+        lines.append(str(len(self.axioms)))
         for axiom in self.axioms:
-            axiom.output(stream)
+            axiom._append_lines(lines)
 
     def get_encoding_size(self):
         task_size = 0
@@ -111,10 +256,14 @@ class SASTask:
 
 
 class SASVariables:
+    __slots__ = ["ranges", "axiom_layers", "value_names"]
+
     def __init__(self, ranges, axiom_layers, value_names):
-        self.ranges = ranges
-        self.axiom_layers = axiom_layers
-        self.value_names = value_names
+        self.ranges = array("i", ranges)
+        self.axiom_layers = array("i", axiom_layers)
+        # Value names often repeat within and across tasks.
+        self.value_names = tuple(tuple(map(sys.intern, names))
+                                 for names in value_names)
 
     def validate(self):
         """Validate variables.
@@ -158,17 +307,17 @@ class SASVariables:
             print("v%d in {%s}%s" % (var, list(range(rang)), axiom_str))
 
     def output(self, stream):
-        print(len(self.ranges), file=stream)
+        _write_lines(stream, self)
+
+    def _append_lines(self, lines):
+        lines.append(str(len(self.ranges)))
         for var, (rang, axiom_layer, values) in enumerate(zip(
                 self.ranges, self.axiom_layers, self.value_names)):
-            print("begin_variable", file=stream)
-            print("var%d" % var, file=stream)
-            print(axiom_layer, file=stream)
-            print(rang, file=stream)
             assert rang == len(values), (rang, values)
-            for value in values:
-                print(value, file=stream)
-            print("end_variable", file=stream)
+            lines += ["begin_variable", "var%d" % var, str(axiom_layer),
+                      str(rang)]
+            lines += map(str, values)
+            lines.append("end_variable")
 
     def get_encoding_size(self):
         # A variable with range k has encoding size k + 1 to also give the
@@ -176,35 +325,69 @@ class SASVariables:
         return len(self.ranges) + sum(self.ranges)
 
 
-class SASMutexGroup:
+class SASMutexGroup(_ArrayComponent):
+    __slots__ = ["_facts"]
+    _array_slots = ("_facts",)
+
     def __init__(self, facts):
         self.facts = sorted(facts)
 
+    @classmethod
+    def _from_array(cls, facts):
+        # Create a group from flat facts as they are stored in SAS+ files.
+        if not _is_sorted_condition(facts):
+            return cls(_unflatten_facts(facts))
+        group = cls.__new__(cls)
+        group._facts = array("i", facts)
+        return group
+
+    @property
+    def facts(self):
+        return _unflatten_facts(self._facts)
+
+    @facts.setter
+    def facts(self, facts):
+        self._facts = _flatten_facts(facts)
+
     def validate(self, variables):
         """Assert that the facts in the mutex group are sorted and unique
         and that they are all valid."""
-        for fact in self.facts:
+        facts = self.facts
+        for fact in facts:
             variables.validate_fact(fact)
-        assert self.facts == sorted(set(self.facts))
+        assert facts == sorted(set(facts))
 
     def dump(self):
         for var, val in self.facts:
             print("v%d: %d" % (var, val))
 
     def output(self, stream):
-        print("begin_mutex_group", file=stream)
-        print(len(self.facts), file=stream)
-        for var, val in self.facts:
-            print(var, val, file=stream)
-        print("end_mutex_group", file=stream)
+        _write_lines(stream, self)
+
+    def _append_lines(self, lines):
+        lines += ["begin_mutex_group", str(len(self._facts) // 2)]
+        lines += _format_facts(self._facts)
+        lines.append("end_mutex_group")
 
     def get_encoding_size(self):
-        return len(self.facts)
+        return len(self._facts) // 2
+
+    def _get_variables(self):
+        return self._facts[0::2]
+
+    def _renumber_variables(self, new_index):
+        # new_index must preserve the order of variables, so the facts
+        # stay sorted.
+        group = SASMutexGroup.__new__(SASMutexGroup)
+        group._facts = _renumber_facts(self._facts, new_index)
+        return group
 
 
 class SASInit:
+    __slots__ = ["values"]
+
     def __init__(self, values):
-        self.values = values
+        self.values = array("i", values)
 
     def validate(self, variables):
         """Validate initial state.
@@ -222,13 +405,17 @@ class SASInit:
             print("v%d: %d" % (var, val))
 
     def output(self, stream):
-        print("begin_state", file=stream)
-        for val in self.values:
-            print(val, file=stream)
-        print("end_state", file=stream)
+        _write_lines(stream, self)
+
+    def _append_lines(self, lines):
+        lines.append("begin_state")
+        lines += map(str, self.values)
+        lines.append("end_state")
 
 
 class SASGoal:
+    __slots__ = ["pairs"]
+
     def __init__(self, pairs):
         self.pairs = sorted(pairs)
 
@@ -242,37 +429,103 @@ class SASGoal:
             print("v%d: %d" % (var, val))
 
     def output(self, stream):
-        print("begin_goal", file=stream)
-        print(len(self.pairs), file=stream)
-        for var, val in self.pairs:
-            print(var, val, file=stream)
-        print("end_goal", file=stream)
+        _write_lines(stream, self)
+
+    def _append_lines(self, lines):
+        lines += ["begin_goal", str(len(self.pairs))]
+        lines += [f"{var} {val}" for var, val in self.pairs]
+        lines.append("end_goal")
 
     def get_encoding_size(self):
         return len(self.pairs)
 
 
-class SASOperator:
+class SASOperator(_ArrayComponent):
+    # The effects are stored in one flat array in the same format as in SAS+
+    # files. Effect i occupies the range
+    # _effects[_effect_offsets[i]:_effect_offsets[i + 1]], which contains the
+    # number of effect conditions, the flattened effect condition, and the
+    # variable with its pre- and post-value.
+    __slots__ = ["name", "cost", "_prevail", "_effects", "_effect_offsets"]
+    _array_slots = ("_prevail", "_effects", "_effect_offsets")
+
     def __init__(self, name, prevail, pre_post, cost):
         self.name = name
         self.prevail = sorted(prevail)
         self.pre_post = self._canonical_pre_post(pre_post)
         self.cost = cost
 
+    @classmethod
+    def _from_arrays(cls, name, prevail, effects, effect_offsets, cost):
+        # Create an operator from flat prevail conditions and effects as
+        # they are stored in SAS+ files. They are only sorted if they are
+        # not in canonical order already.
+        op = cls.__new__(cls)
+        op.name = name
+        op.cost = cost
+        op._prevail = array("i", prevail)
+        op._effects = array("i", effects)
+        op._effect_offsets = array("i", effect_offsets)
+        if not op._is_canonical():
+            op.prevail = sorted(op.prevail)
+            op.pre_post = op._canonical_pre_post(op.pre_post)
+        return op
+
+    def _get_effect_keys(self):
+        # Comparing flat effect conditions is equivalent to comparing the
+        # lists of facts, so these keys are ordered like pre_post.
+        effects = self._effects
+        offsets = self._effect_offsets
+        if len(effects) == 4 * (len(offsets) - 1):
+            # Without effect conditions, every effect has four entries.
+            return list(zip(effects[1::4], effects[2::4], effects[3::4]))
+        return [(effects[end - 3], effects[end - 2], effects[end - 1],
+                 effects[start + 1:end - 3])
+                for start, end in zip(offsets, offsets[1:])]
+
+    def _is_canonical(self):
+        keys = self._get_effect_keys()
+        return (_is_sorted_condition(self._prevail) and
+                all(key1 < key2 for key1, key2 in zip(keys, keys[1:])))
+
+    @property
+    def prevail(self):
+        return _unflatten_facts(self._prevail)
+
+    @prevail.setter
+    def prevail(self, prevail):
+        self._prevail = _flatten_facts(prevail)
+
+    @property
+    def pre_post(self):
+        effects = self._effects
+        offsets = self._effect_offsets
+        return [(effects[end - 3], effects[end - 2], effects[end - 1],
+                 _unflatten_facts(effects[start + 1:end - 3])
+                 if effects[start] else [])
+                for start, end in zip(offsets, offsets[1:])]
+
+    @pre_post.setter
+    def pre_post(self, pre_post):
+        effects = []
+        offsets = [0]
+        for var, pre, post, cond in pre_post:
+            effects.append(len(cond))
+            for fact in cond:
+                effects += fact
+            effects += (var, pre, post)
+            offsets.append(len(effects))
+        self._effects = array("i", effects)
+        self._effect_offsets = array("i", offsets)
+
     def _canonical_pre_post(self, pre_post):
         # Return a sorted and uniquified version of pre_post. We would
         # like to just use sorted(set(pre_post)), but this fails because
         # the effect conditions are a list and hence not hashable.
-        def tuplify(entry):
-            var, pre, post, cond = entry
-            return var, pre, post, tuple(cond)
-        def listify(entry):
-            var, pre, post, cond = entry
-            return var, pre, post, list(cond)
-        pre_post = map(tuplify, pre_post)
-        pre_post = sorted(set(pre_post))
-        pre_post = list(map(listify, pre_post))
-        return pre_post
+        pre_post = sorted({(var, pre, post, tuple(cond))
+                           for var, pre, post, cond in pre_post})
+        return [(var, pre, post, list(cond))
+                for var, pre, post, cond in pre_post]
 
     def validate(self, variables):
         """Validate the operator.
@@ -322,11 +575,13 @@ class SASOperator:
           and follows them.
         """
 
-        variables.validate_condition(self.prevail)
-        assert self.pre_post == self._canonical_pre_post(self.pre_post)
-        prevail_vars = {var for (var, value) in self.prevail}
+        prevail = self.prevail
+        pre_post = self.pre_post
+        variables.validate_condition(prevail)
+        assert self._is_canonical()
+        prevail_vars = {var for (var, value) in prevail}
         pre_values = {}
-        for var, pre, post, cond in self.pre_post:
+        for var, pre, post, cond in pre_post:
             variables.validate_condition(cond)
             assert var not in prevail_vars
             if pre != -1:
@@ -337,11 +592,11 @@ class SASOperator:
                 assert pre_values[var] == pre
             else:
                 pre_values[var] = pre
-        for var, pre, post, cond in self.pre_post:
+        for var, pre, post, cond in pre_post:
             for cvar, cval in cond:
                 assert(cvar not in pre_values or pre_values[cvar] == -1)
                 assert(cvar not in prevail_vars)
-        assert self.pre_post
+        assert pre_post
         assert self.cost >= 0 and self.cost == int(self.cost)
 
     def dump(self):
@@ -359,28 +614,65 @@ class SASOperator:
             print("  v%d: %d -> %d%s" % (var, pre, post, cond_str))
 
     def output(self, stream):
-        print("begin_operator", file=stream)
-        print(self.name[1:-1], file=stream)
-        print(len(self.prevail), file=stream)
-        for var, val in self.prevail:
-            print(var, val, file=stream)
-        print(len(self.pre_post), file=stream)
-        for var, pre, post, cond in self.pre_post:
-            print(len(cond), end=' ', file=stream)
-            for cvar, cval in cond:
-                print(cvar, cval, end=' ', file=stream)
-            print(var, pre, post, file=stream)
-        print(self.cost, file=stream)
-        print("end_operator", file=stream)
+        _write_lines(stream, self)
+
+    def _append_lines(self, lines):
+        lines += ["begin_operator", self.name[1:-1],
+                  str(len(self._prevail) // 2)]
+        lines += _format_facts(self._prevail)
+        effects = self._effects
+        offsets = self._effect_offsets
+        num_effects = len(offsets) - 1
+        lines.append(str(num_effects))
+        if num_effects:
+            # Each effect is stored like its line in the file, so all effect
+            # lines can be formatted at once.
+            if len(effects) == 4 * num_effects:
+                template = "\n".join(["%d %d %d %d"] * num_effects)
+            else:
+                template = "\n".join([" ".join(["%d"] * (end - start))
+                                      for start, end in zip(offsets, offsets[1:])])
+            lines.append(template % tuple(effects))
+        lines += [str(self.cost), "end_operator"]
 
     def get_encoding_size(self):
-        size = 1 + len(self.prevail)
-        for var, pre, post, cond in self.pre_post:
-            size += 1 + len(cond)
-            if pre != -1:
+        size = 1 + len(self._prevail) // 2
+        effects = self._effects
+        offsets = self._effect_offsets
+        for start, end in zip(offsets, offsets[1:]):
+            size += 1 + effects[start]
+            if effects[end - 2] != -1:
                 size += 1
         return size
 
+    def _get_variables(self):
+        effects = self._effects
+        variables = list(self._prevail[0::2])
+        for start, end in zip(self._effect_offsets, self._effect_offsets[1:]):
+            variables += effects[start + 1:end - 3:2]
+            variables.append(effects[end - 3])
+        return variables
+
+    def _renumber_variables(self, new_index):
+        # new_index must preserve the order of variables, so the prevail
+        # conditions, effects and effect conditions stay sorted.
+        op = SASOperator.__new__(SASOperator)
+        op.name = self.name
+        op.cost = self.cost
+        op._prevail = _renumber_facts(self._prevail, new_index)
+        effects = array("i", self._effects)
+        if len(effects) == 4 * (len(self._effect_offsets) - 1):
+            # Without effect conditions, every fourth entry is a variable.
+            effects[1::4] = array("i", [new_index[var] for var in effects[1::4]])
+        else:
+            for start, end in zip(self._effect_offsets, self._effect_offsets[1:]):
+                for pos in range(start + 1, end - 3, 2):
+                    effects[pos] = new_index[effects[pos]]
+                effects[end - 3] = new_index[effects[end - 3]]
+        op._effects = effects
+        op._effect_offsets = self._effect_offsets
+        return op
+
     def get_applicability_conditions(self):
         """Return the combined applicability conditions
         (prevail conditions and preconditions) of the operator.
@@ -399,7 +691,10 @@ class SASOperator:
         return sorted(conditions.items())
 
 
-class SASAxiom:
+class SASAxiom(_ArrayComponent):
+    __slots__ = ["_condition", "effect"]
+    _array_slots = ("_condition",)
+
     def __init__(self, condition, effect):
         self.condition = sorted(condition)
         self.effect = effect
@@ -408,6 +703,27 @@ class SASAxiom:
         for _, val in condition:
             assert val >= 0, condition
 
+    @classmethod
+    def _from_array(cls, condition, effect):
+        # Create an axiom from a flat condition as it is stored in SAS+
+        # files.
+        if not _is_sorted_condition(condition):
+            return cls(_unflatten_facts(condition), effect)
+        axiom = cls.__new__(cls)
+        axiom._condition = array("i", condition)
+        axiom.effect = effect
+        assert effect[1] in (0, 1)
+        assert all(val >= 0 for val in axiom._condition[1::2]), condition
+        return axiom
+
+    @property
+    def condition(self):
+        return _unflatten_facts(self._condition)
+
+    @condition.setter
+    def condition(self, condition):
+        self._condition = _flatten_facts(condition)
+
     def validate(self, variables, init):
 
         """Validate the axiom.
@@ -435,7 +751,8 @@ class SASAxiom:
         "non-init" should be "init" in rule #3.
         """
 
-        variables.validate_condition(self.condition)
+        condition = self.condition
+        variables.validate_condition(condition)
         variables.validate_fact(self.effect)
         eff_var, eff_value = self.effect
         eff_layer = variables.axiom_layers[eff_var]
@@ -444,7 +761,7 @@ class SASAxiom:
         ## The following rule is currently commented out because of
         ## the TODO/bug mentioned in the docstring.
         # assert eff_value != eff_init_value
-        for cond_var, cond_value in self.condition:
+        for cond_var, cond_value in condition:
             cond_layer = variables.axiom_layers[cond_var]
             if cond_layer != -1:
                 assert cond_layer <= eff_layer
@@ -467,13 +784,23 @@ class SASAxiom:
         print("  v%d: %d" % (var, val))
 
     def output(self, stream):
-        print("begin_rule", file=stream)
-        print(len(self.condition), file=stream)
-        for var, val in self.condition:
-            print(var, val, file=stream)
+        _write_lines(stream, self)
+
+    def _append_lines(self, lines):
+        lines += ["begin_rule", str(len(self._condition) // 2)]
+        lines += _format_facts(self._condition)
         var, val = self.effect
-        print(var, 1 - val, val, file=stream)
-        print("end_rule", file=stream)
+        lines += [f"{var} {1 - val} {val}", "end_rule"]
 
     def get_encoding_size(self):
-        return 1 + len(self.condition)
+        return 1 + len(self._condition) // 2
+
+    def _get_variables(self):
+        return list(self._condition[0::2]) + [self.effect[0]]
+
+    def _renumber_variables(self, new_index):
+        axiom = SASAxiom.__new__(SASAxiom)
+        axiom._condition = _renumber_facts(self._condition, new_index)
+        var, val = self.effect
+        axiom.effect = (new_index[var], val)
+        return axiom
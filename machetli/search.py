@@ -1,13 +1,23 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+import json
 import logging
+import os
 from pathlib import Path
+import time
 
 from machetli.environments import LocalEnvironment, EvaluationTask
 from machetli.errors import SubmissionError, PollingError
-from machetli.successors import make_single_successor_generator
-from machetli.tools import batched, configure_logging
+from machetli.successors import Successor, make_single_successor_generator
+from machetli.tools import batched, configure_logging, read_state, write_state
 
+JOURNAL_DIRNAME = "journal"
+JOURNAL_FILENAME = "journal.jsonl"
+JOURNAL_STATE_FILENAME = "state.pickle"
 
-def search(initial_state, successor_generator, evaluator_path, environment=None, deterministic=False):
+
+def search(initial_state, successor_generator, evaluator_path, environment=None, deterministic=False,
+           resume=False, pipelined=False, combine_successors=False):
     """Start a Machetli search and return the resulting state.
 
     The search is started from the *initial state* and *successor generators*
@@ -55,6 +65,36 @@ def search(initial_state, successor_generator, evaluator_path, environment=None,
         force a deterministic order. The search then simulates sequential
         execution.
 
+    :param resume:
+        After each improving successor the search commits to, it records the
+        iteration, the change message and the new state in a journal in the
+        subdirectory ``journal`` of the experiment directory. If the search is
+        interrupted (e.g., because the machine running it restarts), running
+        the same script again with ``resume=True`` continues from the last
+        state recorded in the journal instead of *initial_state*. If there is
+        no journal yet, the search starts from *initial_state* as usual.
+
+    :param pipelined:
+        If set to ``True``, the next batch of successors is generated and
+        written to disk in a background thread while the current batch is
+        evaluated. When an improving successor is found, the prepared batch is
+        deleted again. This saves time if generating successors and writing
+        them to disk takes a significant part of the search time, e.g., for
+        large tasks in a parallel environment. Successor generators are then
+        called from a background thread, but never from two threads at once.
+
+    :param combine_successors:
+        If set to ``True``, the search does not stop evaluating a batch of
+        successors once it found an improving successor. If several successors
+        in the batch are improving and their generator describes their changes
+        in a way that can be combined (e.g., the removal of different
+        operators), the search tries to apply all these changes at once. To
+        this end, it evaluates the combination of all changes, of the first
+        half of them, of the first quarter, and so on, and commits to the
+        largest combination that is improving. If no combination is improving,
+        it commits to the first improving successor. This option can only be
+        used without the option *deterministic*.
+
     :return: the last state where the evaluator was successful, i.e., all
         successors of the resulting state no longer have the evaluated property.
 
@@ -94,10 +134,29 @@ def search(initial_state, successor_generator, evaluator_path, environment=None,
         environment = LocalEnvironment()
     configure_logging(environment.loglevel)
     successor_generator = make_single_successor_generator(successor_generator)
+    if combine_successors and deterministic:
+        logging.critical("The options 'combine_successors' and 'deterministic' "
+                         "cannot be used together.")
+
+    journal_dir = environment.eval_dir / JOURNAL_DIRNAME
+    left_initial_state = False
+    current_state = initial_state
+    if resume:
+        environment.resume()
+        journal_entry = _read_journal(journal_dir)
+        if journal_entry:
+            logging.info(
+                f"Resuming search from the state recorded after iteration "
+                f"{journal_entry['iteration']} ({journal_entry['num_commits']} "
+                f"improving successors so far).")
+            current_state = read_state(journal_dir / JOURNAL_STATE_FILENAME)
+            left_initial_state = True
+        else:
+            logging.info("No search journal found, starting from the initial state.")
 
     environment.start_new_iteration()
     try:
-        environment.remember_initial_state(initial_state)
+        environment.remember_initial_state(current_state)
     except SubmissionError as e:
         # Remembering the initial state can raise a SubmissionError because we
         # prepare a run directory for it immediately to have it available in
@@ -105,28 +164,81 @@ def search(initial_state, successor_generator, evaluator_path, environment=None,
         logging.critical(f"Could not store initial state:\n{e}")
 
     logging.info("Starting search ...")
-    left_initial_state = False
-    current_state = initial_state
-    while True:
-        environment.start_new_iteration()
-        successors = successor_generator.get_successors(current_state)
-        try:
-            improving_state, message = _get_improving_successor(
-                Path(evaluator_path), successors, environment, deterministic)
-        except SubmissionError as e:
-            logging.critical(f"Terminating search because job submission for successor evaluation failed:\n{e}")
-        except PollingError as e:
-            logging.critical(f"Terminating search because querying the status of a submitted successor evaluation failed:\n{e}")
-
-        if message:
-            logging.info(message)
-        if improving_state:
-            left_initial_state = True
-            current_state = improving_state
-        else:
-            if not left_initial_state:
-                _evaluate_initial_state(evaluator_path, environment, deterministic)
-            return current_state
+    try:
+        while True:
+            environment.start_new_iteration()
+            successors = successor_generator.get_successors(current_state)
+            try:
+                improving_state, message = _get_improving_successor(
+                    Path(evaluator_path), current_state, successors, environment,
+                    deterministic, pipelined, combine_successors,
+                    successor_generator)
+            except SubmissionError as e:
+                logging.critical(f"Terminating search because job submission for successor evaluation failed:\n{e}")
+            except PollingError as e:
+                logging.critical(f"Terminating search because querying the status of a submitted successor evaluation failed:\n{e}")
+
+            if message:
+                logging.info(message)
+            if improving_state:
+                left_initial_state = True
+                current_state = improving_state
+                _write_journal_entry(journal_dir, environment.iteration_id,
+                                     message, current_state)
+            else:
+                if not left_initial_state:
+                    _evaluate_initial_state(evaluator_path, environment, deterministic)
+                return current_state
+    finally:
+        environment.shutdown()
+
+
+def _read_journal(journal_dir):
+    """
+    Return the last entry of the journal in *journal_dir* or None if nothing
+    was recorded yet.
+    """
+    journal_path = journal_dir / JOURNAL_FILENAME
+    if not (journal_path.exists() and
+            (journal_dir / JOURNAL_STATE_FILENAME).exists()):
+        return None
+    last_entry = None
+    with journal_path.open() as f:
+        for line in f:
+            try:
+                last_entry = json.loads(line)
+            except json.JSONDecodeError:
+                # The search was interrupted while writing this line. The state
+                # is stored before the line is written, so it is still valid.
+                continue
+    return last_entry
+
+
+def _write_journal_entry(journal_dir, iteration_id, message, state):
+    journal_dir.mkdir(parents=True, exist_ok=True)
+    journal_path = journal_dir / JOURNAL_FILENAME
+    num_commits = 1
+    last_entry = _read_journal(journal_dir)
+    if last_entry:
+        num_commits = last_entry["num_commits"] + 1
+    # Write the state to a temporary file and rename it afterwards, so an
+    # interruption never leaves a partially written state behind.
+    state_path = journal_dir / JOURNAL_STATE_FILENAME
+    tmp_state_path = state_path.with_suffix(".tmp")
+    write_state(state, tmp_state_path)
+    os.replace(tmp_state_path, state_path)
+    entry = {
+        "iteration": iteration_id,
+        "num_commits": num_commits,
+        "message": message,
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with journal_path.open("a") as f:
+        # Start a new line in case an earlier write was interrupted.
+        if f.tell() > 0 and not journal_path.read_bytes().endswith(b"\n"):
+            f.write("\n")
+        f.write(json.dumps(entry) + "\n")
+
 
 def _evaluate_initial_state(evaluator_path, environment, deterministic):
     logging.info("Trying to reproduce the behavior in the initial state.")
@@ -145,54 +257,177 @@ def _evaluate_initial_state(evaluator_path, environment, deterministic):
         logging.info("Confirmed that the behavior is present in the initial state.")
 
 
-def _get_improving_successor(evaluator_path, successors, environment, deterministic):
-    tasks_out_of_resources = set()
-    for batch in batched(successors, environment.batch_size):
-        task_ids = list(range(len(batch)))
-        def on_task_completed(task):
-            if (deterministic and task.status !=
-                    EvaluationTask.DONE_AND_BEHAVIOR_NOT_PRESENT):
-                # Either we have an improving successor, or there was an error.
-                # In both cases deterministic mode cannot continue.
-                task_ids_to_cancel = [i for i in task_ids if i > task.successor_id]
-            elif (not deterministic and task.status ==
-                  EvaluationTask.DONE_AND_BEHAVIOR_PRESENT):
-                # We found an improving successor, so all other evaluations can
-                # be canceled.
-                task_ids_to_cancel = task_ids
-            else:
-                task_ids_to_cancel = None
-            return task_ids_to_cancel
+class _JobPipeline:
+    """
+    Prepare a job for each batch of *successors* when iterated. In pipelined
+    mode, the next job is already prepared in a background thread while the
+    caller evaluates the current one. Notifications for the successor
+    generator are then sent from the same thread, so the generator is never
+    used by two threads at once. Closing the pipeline waits for the
+    background thread and discards a prepared but unused job.
+    """
+
+    def __init__(self, evaluator_path, successors, environment, pipelined,
+                 successor_generator=None):
+        self.evaluator_path = evaluator_path
+        self.batches = batched(successors, environment.batch_size)
+        self.environment = environment
+        self.successor_generator = successor_generator
+        self.executor = None
+        self.future = None
+        if pipelined:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+            self.future = self.executor.submit(self._prepare_next_job)
 
-        tasks = environment.run(evaluator_path, batch, on_task_completed)
+    def _prepare_next_job(self):
+        batch = next(self.batches, None)
+        if batch is None:
+            return None
+        return self.environment.prepare(self.evaluator_path, batch)
+
+    def _notify(self, tasks):
         for task in tasks:
-            if task.status == EvaluationTask.DONE_AND_BEHAVIOR_NOT_PRESENT:
-                continue
-            elif task.status == EvaluationTask.DONE_AND_BEHAVIOR_PRESENT:
-                return task.successor.state, task.successor.change_msg
-            elif task.status == EvaluationTask.OUT_OF_RESOURCES:
-                if deterministic:
-                    return None, (task.error_msg +
-                        "\nAn evaluator ran out of resources. With the option "
-                        "'deterministic' an improving successor found later "
-                        "would not count.")
+            if task.status != EvaluationTask.CANCELED:
+                self.successor_generator.notify_evaluation(task)
+
+    def __iter__(self):
+        if self.executor is None:
+            while (job := self._prepare_next_job()) is not None:
+                yield job
+            return
+        while (job := self.future.result()) is not None:
+            self.future = self.executor.submit(self._prepare_next_job)
+            yield job
+
+    def notify_evaluation(self, tasks):
+        """
+        Pass the results of all evaluated *tasks* to the successor generator.
+        """
+        if self.successor_generator is None:
+            return
+        if self.executor is None:
+            self._notify(tasks)
+        else:
+            # The background thread runs one function at a time, so this
+            # waits until the next job is prepared.
+            self.executor.submit(self._notify, tasks).result()
+
+    def close(self):
+        if self.executor is None:
+            return
+        try:
+            staged_job = self.future.result()
+        except Exception as e:
+            # Errors only matter for jobs we actually evaluate.
+            logging.debug(f"Ignoring error while preparing unused job: {e}")
+            staged_job = None
+        if staged_job is not None:
+            self.environment.discard(staged_job)
+        self.executor.shutdown()
+        self.executor = None
+
+
+def _combine_improving_successors(evaluator_path, state, successors, environment):
+    first_change = successors[0].change
+    changes = [successor.change for successor in successors
+               if first_change is not None and successor.change is not None and
+               first_change.can_combine(successor.change)]
+    if len(changes) < 2:
+        return successors[0].state, successors[0].change_msg
+
+    candidates = []
+    num_changes = len(changes)
+    while num_changes >= 2:
+        combined_change = changes[0]
+        for change in changes[1:num_changes]:
+            combined_change = combined_change.combine(change)
+        candidates.append(Successor(
+            combined_change.apply(state),
+            f"{combined_change.get_change_message(state)} (combined "
+            f"{num_changes} improving successors)",
+            combined_change))
+        num_changes //= 2
+    logging.info(f"Found {len(changes)} improving successors that can be "
+                 f"combined. Evaluating {len(candidates)} combinations.")
+
+    def on_task_completed(task):
+        if task.status == EvaluationTask.DONE_AND_BEHAVIOR_PRESENT:
+            # Smaller combinations are no longer interesting.
+            return list(range(task.successor_id + 1, len(candidates)))
+        return None
+
+    tasks = environment.run(evaluator_path, candidates, on_task_completed)
+    for task in tasks:
+        if task.status == EvaluationTask.DONE_AND_BEHAVIOR_PRESENT:
+            return task.successor.state, task.successor.change_msg
+    logging.info("No combination of improving successors was improving.")
+    return successors[0].state, successors[0].change_msg
+
+
+def _get_improving_successor(evaluator_path, state, successors, environment,
+                             deterministic, pipelined=False,
+                             combine_successors=False, successor_generator=None):
+    tasks_out_of_resources = set()
+    improving_successors = []
+    # Close the pipeline explicitly, so a prepared but unused job is
+    # discarded as soon as we return. Combining improving successors starts
+    # new jobs, so it may only happen after the pipeline is closed.
+    with closing(_JobPipeline(evaluator_path, successors, environment,
+                              pipelined, successor_generator)) as jobs:
+        for job in jobs:
+            task_ids = list(range(len(job.tasks)))
+            def on_task_completed(task):
+                if (deterministic and task.status !=
+                        EvaluationTask.DONE_AND_BEHAVIOR_NOT_PRESENT):
+                    # Either we have an improving successor, or there was an error.
+                    # In both cases deterministic mode cannot continue.
+                    task_ids_to_cancel = [i for i in task_ids if i > task.successor_id]
+                elif (not deterministic and not combine_successors and
+                      task.status == EvaluationTask.DONE_AND_BEHAVIOR_PRESENT):
+                    # We found an improving successor, so all other evaluations can
+                    # be canceled.
+                    task_ids_to_cancel = task_ids
                 else:
-                    tasks_out_of_resources.add(task)
-            elif task.status == EvaluationTask.CRITICAL:
-                if deterministic:
-                    return None, (task.error_msg +
-                        "\nA critical error occurred in an evaluator. With the "
-                        "option 'deterministic' an improving successor found "
-                        "later would not count.")
+                    task_ids_to_cancel = None
+                return task_ids_to_cancel
+
+            tasks = environment.run_prepared(job, on_task_completed)
+            jobs.notify_evaluation(tasks)
+            for task in tasks:
+                if task.status == EvaluationTask.DONE_AND_BEHAVIOR_NOT_PRESENT:
+                    continue
+                elif task.status == EvaluationTask.DONE_AND_BEHAVIOR_PRESENT:
+                    if not combine_successors:
+                        return task.successor.state, task.successor.change_msg
+                    improving_successors.append(task.successor)
+                elif task.status == EvaluationTask.OUT_OF_RESOURCES:
+                    if deterministic:
+                        return None, (task.error_msg +
+                            "\nAn evaluator ran out of resources. With the option "
+                            "'deterministic' an improving successor found later "
+                            "would not count.")
+                    else:
+                        tasks_out_of_resources.add(task)
+                elif task.status == EvaluationTask.CRITICAL:
+                    if deterministic:
+                        return None, (task.error_msg +
+                            "\nA critical error occurred in an evaluator. With the "
+                            "option 'deterministic' an improving successor found "
+                            "later would not count.")
+                    else:
+                        logging.warning(f"{task.error_msg}\nCritical error in "
+                                        f"'{task.run_dir}'")
+                elif task.status == EvaluationTask.CANCELED:
+                    # We only cancel jobs in deterministic mode if there is an earlier reason to return.
+                    assert not deterministic
                 else:
-                    logging.warning(f"{task.error_msg}\nCritical error in "
-                                    f"'{task.run_dir}'")
-            elif task.status == EvaluationTask.CANCELED:
-                # We only cancel jobs in deterministic mode if there is an earlier reason to return.
-                assert not deterministic
-            else:
-                assert False, f"Unexpected task status: '{task.status}'."
+                    assert False, f"Unexpected task status: '{task.status}'."
+            if improving_successors:
+                break
 
+    if improving_successors:
+        return _combine_improving_successors(
+            evaluator_path, state, improving_successors, environment)
     message = "No improving successor was found."
     if tasks_out_of_resources:
         run_dirs = [task.run_dir for task in tasks_out_of_resources]
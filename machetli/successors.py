@@ -10,7 +10,10 @@ generators for PDDL and SAS\ :sup:`+` files are implemented in the packages
 :ref:`extending Machetli<extending-machetli>`.
 """
 
+import logging
+import math
 import random
+import weakref
 
 
 RNG = random.Random(2024)
@@ -22,9 +25,57 @@ reproducible.
 
 
 class Successor:
-    def __init__(self, state, msg):
+    """
+    A successor consists of a *state* and a message *msg* describing how the
+    state was created from its parent. Optionally, a successor generator can
+    describe its change with an object *change* that can be re-applied to the
+    parent state and combined with changes of other successors. Changes must
+    provide the methods ``apply(state)``, ``get_change_message(state)``,
+    ``can_combine(other)``, and ``combine(other)`` (see
+    :class:`ElementRemoval`).
+    """
+    def __init__(self, state, msg, change=None):
         self.state = state
         self.change_msg = msg
+        self.change = change
+
+
+class ElementRemoval:
+    """
+    Change that removes the given *elements* from a state with the method
+    :meth:`remove_elements<RemovalSuccessorGenerator.remove_elements>` of a
+    :class:`RemovalSuccessorGenerator`. Removals of the same generator from
+    the same parent state can be combined into a single removal. The optional
+    *keys* identify the elements independently of the parent state (see
+    :meth:`RemovalSuccessorGenerator.get_element_key`).
+    """
+    def __init__(self, generator, elements, keys=None):
+        self.generator = generator
+        self.elements = elements
+        self.keys = keys
+
+    def apply(self, state):
+        return self.generator.remove_elements(state, self.elements)
+
+    def get_change_message(self, state):
+        return self.generator.get_change_message(state, self.elements)
+
+    def can_combine(self, other):
+        return (isinstance(other, ElementRemoval) and
+                other.generator is self.generator)
+
+    def combine(self, other):
+        elements = list(self.elements)
+        keys = None
+        if self.keys is not None and other.keys is not None:
+            keys = list(self.keys)
+        known_elements = set(elements)
+        for i, element in enumerate(other.elements):
+            if element not in known_elements:
+                elements.append(element)
+                if keys is not None:
+                    keys.append(other.keys[i])
+        return ElementRemoval(self.generator, elements, keys)
 
 
 class SuccessorGenerator:
@@ -40,6 +91,174 @@ class SuccessorGenerator:
     def get_description(self):
         return ""
 
+    def notify_evaluation(self, task):
+        """
+        Called by the search for each evaluated successor, no matter which
+        generator created it. *task* is the :class:`EvaluationTask
+        <machetli.environments.EvaluationTask>` of the evaluation. Generators
+        can override this to learn from the results, e.g., to try
+        transformations that failed before last.
+        """
+        pass
+
+
+class RemovalSuccessorGenerator(SuccessorGenerator):
+    """
+    Base class for successor generators that simplify a state by removing some
+    of its elements, for example operators or objects. Derived classes define
+    which elements of a state can be removed by implementing
+    :meth:`get_elements` and how to remove an arbitrary subset of them at once
+    by implementing :meth:`remove_elements`.
+
+    By default, one successor is generated for each element where only this
+    element is removed. The order of the successors is randomized. Other
+    generators such as :class:`DeltaDebuggingSuccessorGenerator` use the same
+    interface to remove larger chunks of elements at once.
+
+    The generator remembers which elements could not be removed on their own
+    because the behavior was no longer present afterwards. Such removals are
+    likely to fail again in later iterations, so these elements are tried
+    after all other elements. Elements are recognized across states with
+    :meth:`get_element_key`.
+    """
+    def get_elements(self, state):
+        """
+        Return a list of the elements of *state* that can be removed.
+        """
+        raise NotImplementedError
+
+    def remove_elements(self, state, elements):
+        """
+        Return a new state where all given *elements* are removed from
+        *state*. The given state must not be modified.
+        """
+        raise NotImplementedError
+
+    def get_change_message(self, state, elements):
+        """
+        Return a message describing the removal of *elements* from *state*.
+        """
+        return f"Removed {len(elements)} elements."
+
+    def get_element_key(self, state, element):
+        """
+        Return a hashable key that identifies *element* of *state* in other
+        states as well. By default, the element itself is used, which works
+        for elements identified by their name. Override this if elements are
+        identified by an index that changes between states.
+        """
+        return element
+
+    def notify_evaluation(self, task):
+        change = task.successor.change
+        if not (isinstance(change, ElementRemoval) and
+                change.generator is self and change.keys is not None):
+            return
+        # Import here to avoid a circular import.
+        from machetli.environments import EvaluationTask
+        failed_keys = self._get_failed_keys()
+        if task.status == EvaluationTask.DONE_AND_BEHAVIOR_NOT_PRESENT:
+            # Only single removals show that an element itself is needed.
+            if len(change.keys) == 1:
+                failed_keys.add(change.keys[0])
+        elif task.status == EvaluationTask.DONE_AND_BEHAVIOR_PRESENT:
+            failed_keys.difference_update(change.keys)
+
+    def _get_failed_keys(self):
+        # Derived classes do not have to call our constructor.
+        if not hasattr(self, "_failed_keys"):
+            self._failed_keys = set()
+        return self._failed_keys
+
+    def get_ordered_elements(self, state, shuffle=True):
+        """
+        Return the elements of *state* and their keys, with elements whose
+        removal failed before at the end. With *shuffle*, the order is
+        otherwise random.
+        """
+        elements = self.get_elements(state)
+        if shuffle:
+            RNG.shuffle(elements)
+        failed_keys = self._get_failed_keys()
+        keyed_elements = [(element, self.get_element_key(state, element))
+                          for element in elements]
+        keyed_elements.sort(key=lambda item: item[1] in failed_keys)
+        return keyed_elements
+
+    def get_successors(self, state):
+        for element, key in self.get_ordered_elements(state):
+            yield Successor(self.remove_elements(state, [element]),
+                            self.get_change_message(state, [element]),
+                            ElementRemoval(self, [element], [key]))
+
+
+class DeltaDebuggingSuccessorGenerator(SuccessorGenerator):
+    """
+    Removes elements in chunks of decreasing size, similar to the delta
+    debugging algorithm *ddmin*. The elements that the nested generator could
+    remove are split into two halves, and successors are generated that remove
+    one of the halves. After those, the elements are split into quarters, and
+    so on, until the chunks consist of single elements. For more than two
+    chunks, successors that keep only a single chunk are tried before
+    successors that remove a single chunk.
+
+    Successors are generated on demand, so finer granularities are only
+    considered if no successor with a coarser granularity is improving. When
+    the behavior only depends on a few elements, this needs a number of
+    evaluations that is roughly logarithmic in the number of elements instead
+    of linear.
+
+    :param nested_generator: a :class:`RemovalSuccessorGenerator` defining
+        which elements can be removed, e.g.,
+        :class:`RemoveOperators<machetli.sas.RemoveOperators>`.
+    """
+    def __init__(self, nested_generator):
+        self.nested_generator = nested_generator
+
+    def get_description(self):
+        return ("Tries to remove chunks of elements of decreasing size. " +
+                self.nested_generator.get_description())
+
+    def notify_evaluation(self, task):
+        self.nested_generator.notify_evaluation(task)
+
+    def get_successors(self, state):
+        # Elements whose removal failed before end up in the last chunks.
+        keyed_elements = self.nested_generator.get_ordered_elements(
+            state, shuffle=False)
+        num_chunks = min(2, len(keyed_elements))
+        while num_chunks:
+            bounds = _get_chunk_bounds(len(keyed_elements), num_chunks)
+            if num_chunks > 2:
+                for start, end in bounds:
+                    complement = keyed_elements[:start] + keyed_elements[end:]
+                    yield self._create_successor(state, complement)
+            for start, end in bounds:
+                yield self._create_successor(state, keyed_elements[start:end])
+            if num_chunks == len(keyed_elements):
+                break
+            num_chunks = min(2 * num_chunks, len(keyed_elements))
+
+    def _create_successor(self, state, keyed_elements):
+        elements = [element for element, _ in keyed_elements]
+        keys = [key for _, key in keyed_elements]
+        return Successor(
+            self.nested_generator.remove_elements(state, elements),
+            self.nested_generator.get_change_message(state, elements),
+            ElementRemoval(self.nested_generator, elements, keys))
+
+
+def _get_chunk_bounds(num_elements, num_chunks):
+    # Split the range [0, num_elements) into num_chunks ranges whose sizes
+    # differ by at most one.
+    bounds = []
+    start = 0
+    for i in range(num_chunks):
+        end = start + (num_elements - start) // (num_chunks - i)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
 
 class ChainingSuccessorGenerator(SuccessorGenerator):
     """
@@ -53,13 +272,140 @@ class ChainingSuccessorGenerator(SuccessorGenerator):
     """
     def __init__(self, nested_generators):
         self.nested_generators = nested_generators
-    
+
+    def notify_evaluation(self, task):
+        for generator in self.nested_generators:
+            generator.notify_evaluation(task)
+
     def get_successors(self, state):
         for g in self.nested_generators:
             for s in g.get_successors(state):
                 yield s
 
 
+class _GeneratorStatistics:
+    def __init__(self, generator, name):
+        self.generator = generator
+        self.name = name
+        self.num_evaluations = 0
+        self.num_accepted = 0
+        self.total_runtime = 0.0
+        self.num_timed_evaluations = 0
+        self.num_pending = 0
+
+    def get_average_runtime(self, default):
+        # Smooth with one pseudo-evaluation of average cost, so a single fast
+        # or slow evaluation does not dominate the estimate.
+        return ((self.total_runtime + default) /
+                (self.num_timed_evaluations + 1))
+
+
+class AdaptiveChainingSuccessorGenerator(SuccessorGenerator):
+    """
+    Combines multiple generators like :class:`ChainingSuccessorGenerator`, but
+    instead of using a fixed order, it interleaves their successors based on
+    how successful each generator was so far. For each nested generator, it
+    tracks how many of its successors were evaluated, how many of them were
+    improving (accepted by the search), and how long the evaluations took. The
+    next successor is always taken from the generator with the highest
+    estimated number of accepted successors per second of evaluation time,
+    plus an exploration bonus for generators that were rarely tried (as in
+    the UCB1 strategy for multi-armed bandits). Statistics are kept across
+    iterations and are logged whenever the generator is called.
+
+    All successors of all nested generators are eventually generated, so the
+    result of the search is the same kind of local minimum as with
+    :class:`ChainingSuccessorGenerator`; only the order differs.
+
+    :param nested_generators: list of other generators that should be combined.
+    :param exploration: weight of the exploration bonus. Larger values make
+        the generator try rarely used nested generators more often.
+    """
+    def __init__(self, nested_generators, exploration=1.0):
+        self.nested_generators = nested_generators
+        self.exploration = exploration
+        self.statistics = [
+            _GeneratorStatistics(g, f"{i}: {type(g).__name__}")
+            for i, g in enumerate(nested_generators)]
+        # Successors are only referenced weakly, so we do not keep states
+        # alive that the search already discarded.
+        self.statistics_by_successor = weakref.WeakKeyDictionary()
+
+    def get_description(self):
+        return ("Interleaves the following generators based on their success "
+                "so far: " + " ".join(g.get_description()
+                                      for g in self.nested_generators))
+
+    def notify_evaluation(self, task):
+        for generator in self.nested_generators:
+            generator.notify_evaluation(task)
+        statistics = self.statistics_by_successor.pop(task.successor, None)
+        if statistics is None:
+            return
+        # Import here to avoid a circular import.
+        from machetli.environments import EvaluationTask
+        statistics.num_pending = max(0, statistics.num_pending - 1)
+        if task.status == EvaluationTask.CANCELED:
+            return
+        statistics.num_evaluations += 1
+        if task.status == EvaluationTask.DONE_AND_BEHAVIOR_PRESENT:
+            statistics.num_accepted += 1
+        if task.runtime is not None:
+            statistics.total_runtime += task.runtime
+            statistics.num_timed_evaluations += 1
+
+    def _get_score(self, statistics, average_runtime, total_tries):
+        tries = statistics.num_evaluations + statistics.num_pending + 1
+        # Laplace smoothing gives untried generators an acceptance rate of 1/2.
+        acceptance_rate = ((statistics.num_accepted + 1) /
+                           (statistics.num_evaluations + 2))
+        bonus = self.exploration * math.sqrt(2 * math.log(total_tries) / tries)
+        return ((acceptance_rate + bonus) /
+                statistics.get_average_runtime(average_runtime))
+
+    def _get_average_runtime(self):
+        total_runtime = sum(s.total_runtime for s in self.statistics)
+        num_timed = sum(s.num_timed_evaluations for s in self.statistics)
+        if num_timed == 0 or total_runtime == 0:
+            return 1.0
+        return total_runtime / num_timed
+
+    def _log_statistics(self):
+        lines = []
+        for statistics in self.statistics:
+            average_runtime = statistics.get_average_runtime(
+                self._get_average_runtime())
+            lines.append(
+                f"  {statistics.name}: {statistics.num_accepted} of "
+                f"{statistics.num_evaluations} evaluated successors accepted, "
+                f"{average_runtime:.2f}s per evaluation")
+        logging.info("Successor generator statistics:\n" + "\n".join(lines))
+
+    def get_successors(self, state):
+        self._log_statistics()
+        # Successors of earlier states that were not evaluated will never be
+        # reported back.
+        for statistics in self.statistics:
+            statistics.num_pending = 0
+        successor_iterators = {
+            i: iter(statistics.generator.get_successors(state))
+            for i, statistics in enumerate(self.statistics)}
+        while successor_iterators:
+            average_runtime = self._get_average_runtime()
+            total_tries = sum(s.num_evaluations + s.num_pending + 1
+                              for s in self.statistics)
+            # Ties are broken in favor of earlier generators.
+            best = max(successor_iterators, key=lambda i: self._get_score(
+                self.statistics[i], average_runtime, total_tries))
+            successor = next(successor_iterators[best], None)
+            if successor is None:
+                del successor_iterators[best]
+                continue
+            self.statistics[best].num_pending += 1
+            self.statistics_by_successor[successor] = self.statistics[best]
+            yield successor
+
+
 def make_single_successor_generator(generators):
     """
     :param nested_generators: a single :class:`SuccessorGenerator` or list of
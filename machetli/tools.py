@@ -3,15 +3,22 @@ This module is derived from ``tools.py`` of Lab (<https://lab.readthedocs.io>).
 Functions and classes that are not needed for this project were removed.
 """
 from contextlib import contextmanager
+import io
 import itertools
+import locale
 import logging
+import os
 from pathlib import Path
 import pickle
 import re
 import resource
+import selectors
 import shutil
+import signal
 import subprocess
 import sys
+import threading
+import time
 from typing import Union
 
 
@@ -185,9 +192,177 @@ def _time_limit_to_seconds(limit):
 def _memory_limit_to_bytes(limit):
     return _parse_limit(limit, {"K": 1024, "M": 1024**2, "G": 1024**3}, "M")
 
+def _find_stop_pattern(line, stop_patterns):
+    for pattern in stop_patterns:
+        if isinstance(pattern, re.Pattern):
+            if pattern.search(line):
+                return pattern
+        elif pattern in line:
+            return pattern
+    return None
+
+
+def _kill_process_group(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+@contextmanager
+def _forward_sigterm_to_process_group(processes):
+    # Commands run in their own process group, so signals sent to the
+    # process group of the caller do not reach them. This is how environments
+    # cancel evaluations, so kill the commands in *processes* when the caller
+    # receives SIGTERM and then handle the signal as before. Signal handlers
+    # can only be installed in the main thread.
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    previous_handler = signal.getsignal(signal.SIGTERM)
+    if previous_handler is None:
+        previous_handler = signal.SIG_DFL
+
+    def _handle_sigterm(signum, frame):
+        for proc in processes:
+            _kill_process_group(proc)
+        signal.signal(signal.SIGTERM, previous_handler)
+        if callable(previous_handler):
+            previous_handler(signum, frame)
+        elif previous_handler == signal.SIG_DFL:
+            signal.raise_signal(signum)
+
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+
+
+def _run_with_stop_patterns(command, stop_patterns, preexec_fn, input_content,
+                            stdout_file, stderr_file, encoding, text_mode,
+                            kwargs):
+    """
+    Run *command* like subprocess.run, but read its output while it runs and
+    kill it as soon as a line of stdout or stderr matches one of the
+    *stop_patterns*.
+    """
+    timeout = kwargs.pop("timeout", None)
+    check = kwargs.pop("check", False)
+    errors = kwargs.pop("errors", None)
+    for keyword in ["text", "encoding", "universal_newlines"]:
+        kwargs.pop(keyword, None)
+    if text_mode and isinstance(input_content, str):
+        if encoding == "locale":
+            encoding = locale.getpreferredencoding(False)
+        input_content = input_content.encode(encoding, errors or "strict")
+
+    def _prepare_process():
+        # The process runs in its own process group, so we can kill it
+        # together with all processes it started. It stays in the session of
+        # the caller.
+        os.setpgrp()
+        if preexec_fn is not None:
+            preexec_fn()
+
+    processes = []
+    with _forward_sigterm_to_process_group(processes):
+        proc = subprocess.Popen(
+            command, preexec_fn=_prepare_process,
+            stdin=subprocess.PIPE if input_content is not None else None,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs)
+        processes.append(proc)
+        try:
+            return _communicate_with_stop_patterns(
+                proc, command, stop_patterns, input_content, stdout_file,
+                stderr_file, encoding, text_mode, timeout, check, errors)
+        except BaseException:
+            # Like subprocess.run, do not leave the command running if
+            # anything goes wrong, e.g., on KeyboardInterrupt. Signals sent
+            # to our process group do not reach it.
+            _kill_process_group(proc)
+            proc.wait()
+            raise
+
+
+def _communicate_with_stop_patterns(proc, command, stop_patterns,
+                                    input_content, stdout_file, stderr_file,
+                                    encoding, text_mode, timeout, check,
+                                    errors):
+    if input_content is not None:
+        def _write_input():
+            try:
+                proc.stdin.write(input_content)
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        threading.Thread(target=_write_input, daemon=True).start()
+
+    output = {proc.stdout: [], proc.stderr: []}
+    partial_lines = {proc.stdout: b"", proc.stderr: b""}
+    files = {proc.stdout: stdout_file, proc.stderr: stderr_file}
+    stop_pattern = None
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with selectors.DefaultSelector() as selector:
+        for stream in output:
+            selector.register(stream, selectors.EVENT_READ)
+        while selector.get_map():
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    _kill_process_group(proc)
+                    proc.wait()
+                    raise subprocess.TimeoutExpired(
+                        command, timeout, b"".join(output[proc.stdout]),
+                        b"".join(output[proc.stderr]))
+            for key, _ in selector.select(remaining):
+                stream = key.fileobj
+                chunk = os.read(stream.fileno(), 65536)
+                if not chunk:
+                    selector.unregister(stream)
+                    lines = [partial_lines[stream]]
+                else:
+                    output[stream].append(chunk)
+                    if files[stream] is not None:
+                        files[stream].write(chunk)
+                    lines = (partial_lines[stream] + chunk).split(b"\n")
+                    partial_lines[stream] = lines.pop()
+                if stop_pattern is None:
+                    for line in lines:
+                        stop_pattern = _find_stop_pattern(
+                            line.decode(DEFAULT_ENCODING, "replace"),
+                            stop_patterns)
+                        if stop_pattern is not None:
+                            logging.debug(f"Stopping command because its "
+                                          f"output matched '{stop_pattern}'.")
+                            _kill_process_group(proc)
+                            break
+    proc.stdout.close()
+    proc.stderr.close()
+    returncode = proc.wait()
+
+    def _decode(data):
+        if not text_mode:
+            return data
+        # Decode like subprocess does in text mode, including the translation
+        # of universal newlines.
+        return io.TextIOWrapper(io.BytesIO(data), encoding=encoding,
+                                errors=errors).read()
+
+    result = subprocess.CompletedProcess(
+        command, returncode, _decode(b"".join(output[proc.stdout])),
+        _decode(b"".join(output[proc.stderr])))
+    result.stop_pattern = stop_pattern
+    if check and stop_pattern is None:
+        result.check_returncode()
+    return result
+
+
 def run(command, *, cpu_time_limit=None, memory_limit=None,
         core_dump_limit=0, input_filename=None,
-        stdout_filename=None, stderr_filename=None, **kwargs):
+        stdout_filename=None, stderr_filename=None, stop_patterns=None,
+        **kwargs):
     """
     This function is a wrapper for the `run` function of the Python `subprocess`
     module (see
@@ -236,6 +411,18 @@ def run(command, *, cpu_time_limit=None, memory_limit=None,
     :param stderr_filename:
         Redirect output to stderr to be written to the file of the given name.
 
+    :param stop_patterns:
+        A list of strings or compiled regular expressions. If given, the
+        output of the command is read while it runs and the command is killed
+        (together with all processes it started) as soon as a line on stdout
+        or stderr contains one of the strings or matches one of the regular
+        expressions. This is useful if the behavior you are looking for shows
+        up in the output long before the command would terminate. The pattern
+        that matched is stored in the attribute `stop_pattern` of the returned
+        object (`None` if no pattern matched). The output up to the point
+        where the command was killed is available as usual. With `check=True`,
+        no exception is raised for commands killed because of a pattern.
+
     """
     for keyword in ["input", "capture_output", "stdout", "stderr"]:
         if keyword in kwargs:
@@ -309,6 +496,15 @@ def run(command, *, cpu_time_limit=None, memory_limit=None,
     if input_path is not None:
         input_content = _read(input_path)
 
+    if stop_patterns:
+        with _open_or_pipe(stdout_path, "wb") as stdout, \
+                _open_or_pipe(stderr_path, "wb") as stderr:
+            return _run_with_stop_patterns(
+                command, stop_patterns, _prepare_call, input_content,
+                None if stdout is subprocess.PIPE else stdout,
+                None if stderr is subprocess.PIPE else stderr,
+                encoding, text_mode, dict(kwargs))
+
     write_mode = "w" if text_mode else "wb"
     with _open_or_pipe(stdout_path, write_mode) as stdout, \
             _open_or_pipe(stderr_path, write_mode) as stderr:
@@ -321,4 +517,5 @@ def run(command, *, cpu_time_limit=None, memory_limit=None,
     if stderr_filename:
         proc.stderr = _read(stderr_path)
 
+    proc.stop_pattern = None
     return proc
@@ -0,0 +1,405 @@
+"""
+Workers evaluate successors from a work queue on a shared file system. Instead
+of starting a new grid job for every batch of successors, an environment can
+start a number of long-lived workers once and then hand them run directories
+through the queue. A worker is started with::
+
+    python -m machetli.worker QUEUE_DIR [--idle-timeout SECONDS] [--worker-id ID]
+
+The queue consists of files in the directory *QUEUE_DIR*. The search puts one
+file for each task into the subdirectory ``todo``. Workers claim a task by
+atomically moving its file to the subdirectory ``running/ID``, where *ID*
+identifies the worker, so every task is evaluated by exactly one worker. If a
+worker dies, the environment that started it puts the tasks in its
+subdirectory back into the queue before it starts a replacement with the same
+ID. After the evaluation, the worker writes the exit code of the evaluator to
+the file ``exit_code`` and its runtime to the file ``runtime`` in the run
+directory of the task, just like the Slurm array jobs do. The search can cancel
+a task by creating a file with the name of the task in the subdirectory
+``cancel`` and stop all workers by creating the file ``stop``. Before a search
+adds its first task, it removes the stop file and all tasks left over from
+earlier searches in the same queue directory.
+
+Starting a new Python interpreter for each evaluation is expensive compared to
+fast evaluators. Tasks can therefore ask the worker to *preload* their
+evaluator: the worker then executes the evaluator script once without running
+its main block, so all modules it imports are loaded. For each task, it forks
+a child process that runs the evaluator script as ``__main__`` in the run
+directory. The child process reports its result with the same exit codes as an
+evaluator started in a fresh interpreter.
+"""
+
+import argparse
+import builtins
+import json
+import os
+from pathlib import Path
+import shutil
+import signal
+import subprocess
+import sys
+import time
+import traceback
+
+TODO_DIRNAME = "todo"
+RUNNING_DIRNAME = "running"
+CANCEL_DIRNAME = "cancel"
+STOP_FILENAME = "stop"
+EXIT_CODE_FILENAME = "exit_code"
+RUNTIME_FILENAME = "runtime"
+
+DEFAULT_IDLE_TIMEOUT = 600
+"""
+Time in seconds after which a worker without work terminates.
+"""
+POLLING_TIME_INTERVAL = 0.2
+"""
+Time in seconds between checks for new tasks and canceled tasks.
+"""
+KILL_TIMEOUT = 5
+"""
+Time in seconds that canceled evaluators get to terminate after receiving
+SIGTERM before they are killed with SIGKILL.
+"""
+
+
+def _write_file_atomically(path: Path, content: str):
+    # Readers on other nodes either see the complete file or no file at all.
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(content)
+    os.replace(tmp_path, path)
+
+
+class WorkQueue:
+    """
+    Work queue in the directory *queue_dir*, which has to be on a file system
+    that is shared between the search and all workers.
+    """
+
+    def __init__(self, queue_dir):
+        self.queue_dir = Path(queue_dir)
+        self.todo_dir = self.queue_dir / TODO_DIRNAME
+        self.running_dir = self.queue_dir / RUNNING_DIRNAME
+        self.cancel_dir = self.queue_dir / CANCEL_DIRNAME
+        self.stop_file = self.queue_dir / STOP_FILENAME
+        for directory in [self.todo_dir, self.running_dir, self.cancel_dir]:
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def reset(self):
+        """
+        Remove all tasks, cancellations and the stop request left over from
+        an earlier run, so the queue can be used for a new run. This must be
+        called by the search before it adds tasks, not by the workers.
+        """
+        for directory in [self.todo_dir, self.running_dir, self.cancel_dir]:
+            for path in directory.iterdir():
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+                    continue
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+        try:
+            self.stop_file.unlink()
+        except FileNotFoundError:
+            pass
+
+    def put(self, name, run_dir, evaluator_path, state_filename, preload=False):
+        """
+        Add a task called *name* that evaluates the state in *run_dir* with
+        the evaluator at *evaluator_path*. If *preload* is set, the worker
+        evaluates the state in a forked child process of a preloaded evaluator
+        instead of starting a new interpreter.
+        """
+        spec = {
+            "run_dir": str(Path(run_dir).absolute()),
+            "evaluator_path": str(Path(evaluator_path).absolute()),
+            "state_filename": state_filename,
+            "preload": preload,
+        }
+        _write_file_atomically(self.todo_dir / name, json.dumps(spec))
+
+    def _get_worker_dir(self, worker_id):
+        return self.running_dir / str(worker_id)
+
+    def claim(self, worker_id):
+        """
+        Take the next task from the queue for the worker *worker_id* and
+        return its name and specification, or (None, None) if there is no
+        task.
+        """
+        worker_dir = self._get_worker_dir(worker_id)
+        for path in sorted(self.todo_dir.iterdir()):
+            if path.name.startswith("."):
+                continue
+            worker_dir.mkdir(exist_ok=True)
+            try:
+                os.rename(path, worker_dir / path.name)
+            except FileNotFoundError:
+                # Another worker claimed the task first.
+                continue
+            spec = json.loads((worker_dir / path.name).read_text())
+            return path.name, spec
+        return None, None
+
+    def cancel(self, name):
+        """
+        Cancel the task *name*. Tasks that were not claimed yet are removed
+        from the queue, running evaluations are killed by their worker.
+        """
+        try:
+            (self.todo_dir / name).unlink()
+        except FileNotFoundError:
+            (self.cancel_dir / name).touch()
+
+    def is_canceled(self, name):
+        return (self.cancel_dir / name).exists()
+
+    def finish(self, name, worker_id):
+        """
+        Remove all files belonging to the task *name*, which was claimed by
+        the worker *worker_id*, from the queue.
+        """
+        for path in [self._get_worker_dir(worker_id) / name,
+                     self.cancel_dir / name]:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def requeue_tasks_of_worker(self, worker_id):
+        """
+        Put the tasks claimed by the worker *worker_id* back into the queue.
+        This must only be called while this worker is not running, e.g.,
+        after it was killed by the grid engine while it was evaluating a
+        task.
+        """
+        worker_dir = self._get_worker_dir(worker_id)
+        if not worker_dir.exists():
+            return
+        for path in worker_dir.iterdir():
+            if not path.name.startswith("."):
+                os.replace(path, self.todo_dir / path.name)
+
+    def stop(self):
+        """
+        Ask all workers to terminate after their current task.
+        """
+        self.stop_file.touch()
+
+    def is_stopped(self):
+        return self.stop_file.exists()
+
+
+def _kill(process):
+    for sig in [signal.SIGTERM, signal.SIGKILL]:
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            pass
+        try:
+            process.wait(timeout=KILL_TIMEOUT)
+            return
+        except subprocess.TimeoutExpired:
+            pass
+    process.wait()
+
+
+class _PreloadedEvaluator:
+    """
+    Evaluator script whose top-level code was executed once in the worker.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime_ns
+        self.code = compile(Path(path).read_bytes(), path, "exec")
+        # Imports relative to the evaluator's directory should work like they
+        # do when the script is started directly.
+        script_dir = str(Path(path).parent)
+        if script_dir not in sys.path:
+            sys.path.insert(0, script_dir)
+        # Use a name other than "__main__", so the main block of the script
+        # does not run.
+        exec(self.code, {"__name__": "__machetli_evaluator__",
+                         "__file__": path, "__builtins__": builtins})
+
+    def is_outdated(self):
+        return os.stat(self.path).st_mtime_ns != self.mtime
+
+
+class _ForkedProcess:
+    """
+    Minimal counterpart of subprocess.Popen for a forked child process.
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.returncode = None
+
+    def poll(self):
+        if self.returncode is None:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+            if pid:
+                # Same convention as subprocess.Popen.returncode. We cannot
+                # use os.waitstatus_to_exitcode(), which needs Python 3.9.
+                if os.WIFSIGNALED(status):
+                    self.returncode = -os.WTERMSIG(status)
+                else:
+                    self.returncode = os.WEXITSTATUS(status)
+        return self.returncode
+
+    def wait(self, timeout=None):
+        start = time.monotonic()
+        while self.poll() is None:
+            if timeout is not None and time.monotonic() - start > timeout:
+                raise subprocess.TimeoutExpired(str(self.pid), timeout)
+            time.sleep(0.01)
+        return self.returncode
+
+
+def _get_exit_code(exit_exception):
+    # Mirror how the interpreter turns SystemExit into an exit code.
+    code = exit_exception.code
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _fork_evaluator(evaluator, run_dir, state_filename):
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid:
+        return _ForkedProcess(pid)
+    exit_code = 1
+    try:
+        # Start a new session like evaluators started with Popen.
+        os.setsid()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        os.chdir(run_dir)
+        for fd, filename in [(1, "run.log"), (2, "run.err")]:
+            file_fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.dup2(file_fd, fd)
+            os.close(file_fd)
+        sys.argv = [evaluator.path, state_filename]
+        try:
+            exec(evaluator.code, {"__name__": "__main__",
+                                  "__file__": evaluator.path,
+                                  "__builtins__": builtins})
+            exit_code = 0
+        except SystemExit as e:
+            exit_code = _get_exit_code(e)
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(exit_code)
+
+
+_preloaded_evaluators = {}
+
+
+def _get_preloaded_evaluator(path):
+    evaluator = _preloaded_evaluators.get(path)
+    if evaluator is None or evaluator.is_outdated():
+        try:
+            evaluator = _PreloadedEvaluator(path)
+        except BaseException:
+            # Evaluate the task in a fresh interpreter instead, so the error
+            # shows up in its logs.
+            traceback.print_exc()
+            evaluator = None
+        _preloaded_evaluators[path] = evaluator
+    return evaluator
+
+
+def _run_task(queue, name, spec):
+    run_dir = Path(spec["run_dir"])
+    start_time = time.monotonic()
+    evaluator = None
+    if spec.get("preload"):
+        evaluator = _get_preloaded_evaluator(spec["evaluator_path"])
+    if evaluator:
+        process = _fork_evaluator(evaluator, run_dir, spec["state_filename"])
+    else:
+        cmd = [sys.executable, spec["evaluator_path"], spec["state_filename"]]
+        with (run_dir/"run.log").open("w") as run_log, (run_dir/"run.err").open("w") as run_err:
+            # Start a new session, so we can kill the evaluator together with
+            # all processes it started if the task is canceled.
+            process = subprocess.Popen(cmd, cwd=run_dir, stdout=run_log,
+                                       stderr=run_err, start_new_session=True)
+    try:
+        # Check often at first, so fast evaluations do not wait for the
+        # polling interval.
+        wait_time = 0.001
+        while process.poll() is None:
+            if queue.is_canceled(name):
+                return
+            time.sleep(wait_time)
+            wait_time = min(2 * wait_time, POLLING_TIME_INTERVAL)
+    finally:
+        # Also reached if the worker itself is terminated.
+        if process.poll() is None:
+            _kill(process)
+    _write_file_atomically(run_dir/RUNTIME_FILENAME,
+                           f"{time.monotonic() - start_time}\n")
+    # The search treats the task as done as soon as this file exists.
+    _write_file_atomically(run_dir/EXIT_CODE_FILENAME, f"{process.returncode}\n")
+
+
+def run_worker(queue_dir, idle_timeout=DEFAULT_IDLE_TIMEOUT, worker_id=None):
+    """
+    Evaluate tasks from the queue in *queue_dir* until the queue is stopped or
+    no new task arrived for *idle_timeout* seconds. Tasks are claimed under
+    the name *worker_id*, which defaults to the process ID. No two running
+    workers may use the same ID.
+    """
+    if worker_id is None:
+        worker_id = os.getpid()
+    queue = WorkQueue(queue_dir)
+    last_activity = time.monotonic()
+    while not queue.is_stopped():
+        name, spec = queue.claim(worker_id)
+        if name is None:
+            if time.monotonic() - last_activity > idle_timeout:
+                break
+            time.sleep(POLLING_TIME_INTERVAL)
+            continue
+        try:
+            if not queue.is_canceled(name):
+                _run_task(queue, name, spec)
+        finally:
+            queue.finish(name, worker_id)
+        last_activity = time.monotonic()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Evaluate successors from a Machetli work queue.")
+    parser.add_argument("queue_dir", help="directory of the work queue")
+    parser.add_argument(
+        "--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT,
+        help="terminate after this many seconds without work "
+             "(default: %(default)s)")
+    parser.add_argument(
+        "--worker-id",
+        help="name under which tasks are claimed, unique among the workers "
+             "of the queue (default: process ID)")
+    args = parser.parse_args()
+    # Turn SIGTERM (e.g., from scancel) into an exception, so running
+    # evaluators are killed on the way out.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    run_worker(args.queue_dir, args.idle_timeout, args.worker_id)
+
+
+if __name__ == "__main__":
+    main()
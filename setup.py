@@ -1,6 +1,6 @@
 # Publishing a new version:
 #
-# 1. Update the version tag in this file.
+# 1. Update the version tag in machetli/__init__.py.
 # 2. Remove the `dist/` and the `machetli.egg-info` directories
 # 3. Run the following steps (needs `pip install build twine`):
 #
@@ -10,14 +10,18 @@
 # 4. Enter the API token
 
 from pathlib import Path
+import re
 
 from setuptools import setup, find_packages
 
 long_description = Path("README.rst").read_text(encoding="utf-8")
+version = re.search(r'^__version__ = "(.+)"$',
+                    Path("machetli/__init__.py").read_text(encoding="utf-8"),
+                    re.MULTILINE).group(1)
 
 setup(
     name="machetli",
-    version="0.12",
+    version=version,
     description="Locate bugs in your program",
     long_description=long_description,
     long_description_content_type="text/x-rst",
@@ -44,6 +48,7 @@ setup(
     package_data={
         "machetli": [
             "templates/slurm-array-job.template",
+            "templates/slurm-worker-job.template",
             "templates/interview/evaluator.py.tmpl",
             "templates/interview/run.py.tmpl",
         ],